@@ -6,7 +6,7 @@ set -o errexit
 pip install -r requirements.txt
 
 # Install critical packages explicitly
-pip install gunicorn whitenoise
+pip install gunicorn uvicorn whitenoise
 
 # Show installed packages for debugging
 pip list
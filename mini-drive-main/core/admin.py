@@ -1,15 +1,137 @@
 from django.contrib import admin
-from django.utils.html import format_html
-from django.urls import reverse
-from .models import File, Folder, Embedding, ShareToken, FolderShareToken
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Max, Q
+from django.template.defaultfilters import filesizeformat
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from django.urls import path, reverse
+from .models import (
+    File,
+    Folder,
+    Embedding,
+    ShareToken,
+    FolderShareToken,
+    RevokedShare,
+    StorageUsage,
+    PurgeQueueItem,
+    ProcessingRecord,
+    RequestProfile,
+)
+
+# Unfiltered changelists above this many rows show an estimated total
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) over a whole large table.
+
+    For an unfiltered changelist the total comes from the planner statistics
+    on PostgreSQL, or the highest primary key elsewhere, both of which are
+    cheap lookups. Small tables and filtered or searched lists are still
+    counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            estimate = self.estimate(self.object_list.model)
+            if estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+    def estimate(self, model):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        return model._default_manager.aggregate(top=Max("pk"))["top"] or 0
+
+
+class ProcessingErrorFilter(admin.SimpleListFilter):
+    """
+    Filter files by the class of their processing error.
+
+    The choices are the errors the processing stages are known to raise, so
+    listing them needs no SELECT DISTINCT over the unindexed column.
+    """
+
+    title = "processing error"
+    parameter_name = "processing_error"
+    KNOWN_ERRORS = [
+        ("FileDataError", "Unreadable PDF"),
+        ("UnidentifiedImageError", "Unreadable image"),
+        ("APIConnectionError", "Embedding API unreachable"),
+        ("APITimeoutError", "Embedding API timeout"),
+        ("RateLimitError", "Embedding API rate limit"),
+        ("AuthenticationError", "Embedding API key"),
+        ("FileNotFoundError", "Missing blob"),
+    ]
+
+    def lookups(self, request, model_admin):
+        return [*self.KNOWN_ERRORS, ("other", "Other")]
+
+    def queryset(self, request, queryset):
+        if self.value() == "other":
+            known = [error_class for error_class, _ in self.KNOWN_ERRORS]
+            return queryset.exclude(processing__error_class__in=[*known, ""]).filter(
+                processing__isnull=False
+            )
+        if self.value():
+            return queryset.filter(processing__error_class=self.value())
+        return queryset
+
+
+class ScalableAdminMixin:
+    """Changelist settings shared by the admins of the large tables."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class EmbeddingInline(admin.StackedInline):
     model = Embedding
-    readonly_fields = ("vector",)
+    fields = ("dimension", "extracted_text")
+    readonly_fields = ("dimension",)
+    can_delete = False
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("vector")
+
+
+class ProcessingRecordInline(admin.StackedInline):
+    model = ProcessingRecord
+    fields = (
+        "status",
+        "failed_stage",
+        "error_class",
+        "error_message",
+        "stages",
+        "total_ms",
+        "cpu_ms",
+        "bytes_in",
+        "pages",
+        "text_length",
+        "retries",
+        "processed_at",
+    )
+    readonly_fields = fields
     can_delete = False
     extra = 0
 
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 class ShareTokenInline(admin.TabularInline):
     model = ShareToken
@@ -18,7 +140,7 @@ class ShareTokenInline(admin.TabularInline):
 
 
 @admin.register(File)
-class FileAdmin(admin.ModelAdmin):
+class FileAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "name",
         "owner_username",
@@ -26,18 +148,30 @@ class FileAdmin(admin.ModelAdmin):
         "size_formatted",
         "uploaded",
         "processed",
+        "processing_status",
+        "processing_ms",
+        "processing_cpu_ms",
         "has_thumb",
         "view_link",
     )
-    list_filter = ("processed", "uploaded", "mime_type")
+    list_filter = (
+        "processed",
+        "processing__status",
+        "processing__failed_stage",
+        ProcessingErrorFilter,
+        "uploaded",
+        "mime_type",
+    )
+    list_select_related = ("owner", "folder", "processing")
     search_fields = ("name", "owner__username")
     readonly_fields = ("size", "uploaded", "processed", "preview_thumb")
-    inlines = [EmbeddingInline, ShareTokenInline]
+    inlines = [EmbeddingInline, ProcessingRecordInline, ShareTokenInline]
 
     def owner_username(self, obj):
         return obj.owner.username
 
     owner_username.short_description = "Owner"
+    owner_username.admin_order_field = "owner__username"
 
     def folder_name(self, obj):
         if obj.folder:
@@ -46,6 +180,33 @@ class FileAdmin(admin.ModelAdmin):
 
     folder_name.short_description = "Folder"
 
+    def processing_record(self, obj):
+        try:
+            return obj.processing
+        except ProcessingRecord.DoesNotExist:
+            return None
+
+    def processing_status(self, obj):
+        record = self.processing_record(obj)
+        return record.get_status_display() if record else "-"
+
+    processing_status.short_description = "Processing"
+    processing_status.admin_order_field = "processing__status"
+
+    def processing_ms(self, obj):
+        record = self.processing_record(obj)
+        return f"{record.total_ms:.0f}" if record else "-"
+
+    processing_ms.short_description = "Time (ms)"
+    processing_ms.admin_order_field = "processing__total_ms"
+
+    def processing_cpu_ms(self, obj):
+        record = self.processing_record(obj)
+        return f"{record.cpu_ms:.0f}" if record else "-"
+
+    processing_cpu_ms.short_description = "CPU (ms)"
+    processing_cpu_ms.admin_order_field = "processing__cpu_ms"
+
     def size_formatted(self, obj):
         # Convert bytes to appropriate unit
         size = obj.size
@@ -106,24 +267,27 @@ class FileInline(admin.TabularInline):
 
 
 @admin.register(Folder)
-class FolderAdmin(admin.ModelAdmin):
+class FolderAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "name",
         "owner_username",
         "parent_folder",
         "created",
-        "file_count",
+        "total_files",
+        "total_size_formatted",
         "view_link",
     )
     list_filter = ("created",)
+    list_select_related = ("owner", "parent")
     search_fields = ("name", "owner__username")
-    readonly_fields = ("created", "full_path")
+    readonly_fields = ("created", "full_path", "total_files", "total_size")
     inlines = [FolderShareTokenInline, FileInline]
 
     def owner_username(self, obj):
         return obj.owner.username
 
     owner_username.short_description = "Owner"
+    owner_username.admin_order_field = "owner__username"
 
     def parent_folder(self, obj):
         if obj.parent:
@@ -133,19 +297,28 @@ class FolderAdmin(admin.ModelAdmin):
     parent_folder.short_description = "Parent Folder"
 
     def full_path(self, obj):
-        path = []
-        current = obj
-        while current:
-            path.insert(0, current.name)
-            current = current.parent
-        return "/" + "/".join(path)
+        return "/" + "/".join(folder.name for folder in obj.get_breadcrumbs())
 
     full_path.short_description = "Full Path"
 
-    def file_count(self, obj):
-        return obj.files.count()
-
-    file_count.short_description = "Files"
+    def total_size_formatted(self, obj):
+        return filesizeformat(obj.total_size)
+
+    total_size_formatted.short_description = "Total size"
+    total_size_formatted.admin_order_field = "total_size"
+
+    def delete_queryset(self, request, queryset):
+        # Go through Folder.delete so subtrees and blobs are handled. Selected
+        # subfolders go with the top-most selected folder above them; sorted
+        # by path, a subtree directly follows its root.
+        roots = []
+        for folder in sorted(queryset.all(), key=lambda folder: folder.path):
+            if not (roots and folder.path.startswith(roots[-1].path)):
+                roots.append(folder)
+        for folder in roots:
+            # Skip folders deleted since the selection was loaded
+            if Folder.objects.filter(pk=folder.pk).exists():
+                folder.delete()
 
     def view_link(self, obj):
         # Create a view link
@@ -156,10 +329,24 @@ class FolderAdmin(admin.ModelAdmin):
 
 
 @admin.register(Embedding)
-class EmbeddingAdmin(admin.ModelAdmin):
-    list_display = ("file_name", "owner_username", "vector_length", "has_text")
+class EmbeddingAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("file_name", "owner_username", "dimension", "has_text")
+    list_select_related = ("file__owner",)
     search_fields = ("file__name", "file__owner__username")
-    readonly_fields = ("vector", "extracted_text_preview")
+    readonly_fields = ("dimension", "vector", "extracted_text_preview")
+
+    def get_queryset(self, request):
+        # Only the detail page needs the vector and the full text
+        has_text = ExpressionWrapper(
+            Q(extracted_text__isnull=False) & ~Q(extracted_text=""),
+            output_field=BooleanField(),
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .defer("vector", "extracted_text")
+            .annotate(_has_text=has_text)
+        )
 
     def file_name(self, obj):
         return obj.file.name
@@ -171,18 +358,12 @@ class EmbeddingAdmin(admin.ModelAdmin):
 
     owner_username.short_description = "Owner"
 
-    def vector_length(self, obj):
-        if isinstance(obj.vector, list):
-            return len(obj.vector)
-        return 0
-
-    vector_length.short_description = "Vector Length"
-
     def has_text(self, obj):
-        return bool(obj.extracted_text)
+        return obj._has_text
 
     has_text.boolean = True
     has_text.short_description = "Has Text"
+    has_text.admin_order_field = "_has_text"
 
     def extracted_text_preview(self, obj):
         if obj.extracted_text:
@@ -196,7 +377,7 @@ class EmbeddingAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShareToken)
-class ShareTokenAdmin(admin.ModelAdmin):
+class ShareTokenAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "uuid",
         "file_name",
@@ -206,6 +387,7 @@ class ShareTokenAdmin(admin.ModelAdmin):
         "view_link",
     )
     list_filter = ("expiry",)
+    list_select_related = ("file__owner",)
     search_fields = ("file__name", "file__owner__username")
     readonly_fields = ("uuid", "expiry")
 
@@ -228,7 +410,7 @@ class ShareTokenAdmin(admin.ModelAdmin):
 
 
 @admin.register(FolderShareToken)
-class FolderShareTokenAdmin(admin.ModelAdmin):
+class FolderShareTokenAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "uuid",
         "folder_name",
@@ -238,6 +420,7 @@ class FolderShareTokenAdmin(admin.ModelAdmin):
         "view_link",
     )
     list_filter = ("expiry",)
+    list_select_related = ("folder__owner",)
     search_fields = ("folder__name", "folder__owner__username")
     readonly_fields = ("uuid", "expiry")
 
@@ -263,3 +446,132 @@ class FolderShareTokenAdmin(admin.ModelAdmin):
         return format_html('<a href="{}" target="_blank">View</a>', url)
 
     view_link.short_description = "Actions"
+
+
+
+@admin.register(RevokedShare)
+class RevokedShareAdmin(admin.ModelAdmin):
+    list_display = ("jti", "expiry")
+    list_filter = ("expiry",)
+    search_fields = ("jti",)
+    readonly_fields = ("jti", "expiry")
+
+
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    list_display = ("user", "bytes_used", "file_count")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    readonly_fields = ("user", "bytes_used", "file_count")
+
+
+@admin.register(PurgeQueueItem)
+class PurgeQueueItemAdmin(admin.ModelAdmin):
+    list_display = ("name", "created")
+    list_filter = ("created",)
+    search_fields = ("name",)
+    readonly_fields = ("name", "created")
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "method",
+        "path",
+        "user",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "query_ms",
+        "downloads",
+    )
+    list_filter = ("view_name", "created")
+    list_select_related = ("user",)
+    search_fields = ("path", "user__username")
+    exclude = ("queries", "stacks")
+    readonly_fields = (
+        "created",
+        "user",
+        "method",
+        "path",
+        "view_name",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "query_ms",
+        "sample_count",
+        "downloads",
+        "slowest_queries",
+    )
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Only the detail page needs the logs
+        if request.resolver_match.url_name.endswith("changelist"):
+            queryset = queryset.defer("queries", "stacks")
+        return queryset
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:object_id>/stacks/",
+                self.admin_site.admin_view(self.download_stacks),
+                name="core_requestprofile_stacks",
+            ),
+            path(
+                "<int:object_id>/json/",
+                self.admin_site.admin_view(self.download_json),
+                name="core_requestprofile_json",
+            ),
+        ] + super().get_urls()
+
+    def download_stacks(self, request, object_id):
+        profile = get_object_or_404(RequestProfile, id=object_id)
+        response = HttpResponse(profile.stacks, content_type="text/plain")
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{profile.id}.folded"'
+        )
+        return response
+
+    def download_json(self, request, object_id):
+        profile = get_object_or_404(RequestProfile, id=object_id)
+        fields = [field.attname for field in RequestProfile._meta.concrete_fields]
+        response = JsonResponse(
+            {name: getattr(profile, name) for name in fields},
+            json_dumps_params={"indent": 2},
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{profile.id}.json"'
+        )
+        return response
+
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">Flamegraph stacks</a> | <a href="{}">JSON</a>',
+            reverse("admin:core_requestprofile_stacks", args=[obj.id]),
+            reverse("admin:core_requestprofile_json", args=[obj.id]),
+        )
+
+    downloads.short_description = "Download"
+
+    def slowest_queries(self, obj):
+        queries = sorted(obj.queries, key=lambda query: query["ms"], reverse=True)
+        if not queries:
+            return "-"
+        return format_html(
+            "<table>{}</table>",
+            format_html_join(
+                "",
+                "<tr><td>{}&nbsp;ms</td><td><code>{}</code></td></tr>",
+                ((query["ms"], query["sql"]) for query in queries[:20]),
+            ),
+        )
+
+    slowest_queries.short_description = "Slowest queries"
@@ -0,0 +1,141 @@
+"""
+Streaming Gemini chat, optionally grounded in the user's own files.
+
+Replies come from the Gemini REST API (``streamGenerateContent`` with
+``alt=sse``) through a long-lived ``httpx.AsyncClient``, so connections and
+TLS sessions are reused across requests instead of being set up per call.
+A client is bound to the event loop that created it (see ``clients``): under
+ASGI that is one client per worker process, while under WSGI each request
+runs in its own loop and gets a fresh client, closed with that loop.
+
+Grounding passes the ``k`` chunks of the user's extracted text that share
+the most terms with the prompt to the model as context.
+"""
+
+import json
+import re
+from collections import Counter
+import httpx
+from django.conf import settings
+from django.db.models import Q
+from .clients import loop_client
+from .models import Embedding
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Files whose text is scored when grounding a prompt, at most
+CANDIDATE_FILES = 50
+# Prompt terms used to find candidate files, longest first
+MAX_QUERY_TERMS = 8
+
+WORD_RE = re.compile(r"\w{3,}")
+STOPWORDS = frozenset(
+    "the and for are but not you your with this that from have has was were "
+    "what which who how why when where about into than then them they there "
+    "can could would should will does did its our out all any".split()
+)
+
+GROUNDING_INSTRUCTION = (
+    "Answer the question. Where the excerpts below from the user's files are "
+    "relevant, base the answer on them and cite the file name in brackets."
+)
+
+class ChatError(Exception):
+    """The model could not be reached or returned an error."""
+
+
+def get_client():
+    """Return the shared client of the running event loop."""
+    return loop_client(
+        "gemini",
+        lambda: httpx.AsyncClient(
+            base_url=settings.GEMINI_API_BASE,
+            headers={"x-goog-api-key": settings.GEMINI_API_KEY or ""},
+            timeout=httpx.Timeout(settings.GEMINI_TIMEOUT, connect=10),
+        ),
+        lambda client: client.aclose(),
+    )
+
+
+def words(text):
+    return [
+        word
+        for word in (match.lower() for match in WORD_RE.findall(text))
+        if word not in STOPWORDS
+    ]
+
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split ``text`` into overlapping windows of ``size`` characters."""
+    step = size - overlap
+    return [
+        text[start : start + size]
+        for start in range(0, max(len(text) - overlap, 1), step)
+    ]
+
+
+async def retrieve_context(user_id, prompt, k=3):
+    """
+    Return up to ``k`` ``(file name, chunk)`` pairs from the user's files.
+
+    Chunks are ranked by how many distinct prompt terms they contain, then by
+    how often those terms occur.
+    """
+    terms = sorted(set(words(prompt)), key=len, reverse=True)[:MAX_QUERY_TERMS]
+    if not terms or k <= 0:
+        return []
+
+    match = Q()
+    for term in terms:
+        match |= Q(extracted_text__icontains=term)
+    candidates = (
+        Embedding.objects.filter(match, file__owner_id=user_id)
+        .order_by("-file__uploaded")
+        .values_list("file__name", "extracted_text")[:CANDIDATE_FILES]
+    )
+
+    scored = []
+    async for name, text in candidates:
+        for chunk in chunk_text(text):
+            counts = Counter(words(chunk))
+            found = [term for term in terms if counts[term]]
+            if found:
+                score = (len(found), sum(counts[term] for term in found))
+                scored.append((score, name, chunk))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [(name, chunk) for score, name, chunk in scored[:k]]
+
+
+def build_request(prompt, context=()):
+    body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if context:
+        excerpts = "\n\n".join(f"[{name}]\n{chunk}" for name, chunk in context)
+        body["systemInstruction"] = {
+            "parts": [{"text": f"{GROUNDING_INSTRUCTION}\n\n{excerpts}"}]
+        }
+    return body
+
+
+async def stream_reply(prompt, context=()):
+    """Yield the text of a Gemini reply as it is generated."""
+    url = f"/v1beta/models/{settings.GEMINI_MODEL}:streamGenerateContent"
+    try:
+        async with get_client().stream(
+            "POST", url, params={"alt": "sse"}, json=build_request(prompt, context)
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise ChatError(
+                    f"Gemini returned {response.status_code}: {response.text[:200]}"
+                )
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = json.loads(line[len("data:") :])
+                for candidate in payload.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+    except httpx.HTTPError as e:
+        raise ChatError(f"Gemini request failed: {e}") from e
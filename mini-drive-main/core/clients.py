@@ -0,0 +1,45 @@
+"""
+Async HTTP clients shared within one event loop.
+
+An ``httpx.AsyncClient`` (or an SDK client wrapping one) is bound to the loop
+it first ran on. Under ASGI that loop lives as long as the worker, so keeping
+one client per loop reuses connections across requests. Under WSGI every
+request runs on a loop of its own, which asgiref closes afterwards. Each
+client is therefore closed together with its loop: a small async generator
+is started alongside it, and the loop finalises it in ``shutdown_asyncgens()``
+before closing, which both ``asyncio.run()`` and asgiref call.
+"""
+
+import asyncio
+
+_clients = {}
+
+
+def loop_client(name, create, close):
+    """
+    Return the running loop's ``name`` client, creating it with ``create()``.
+
+    ``close`` is a coroutine function called with the client as the loop
+    shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, name)
+    entry = _clients.get(key)
+    if entry is None:
+        # Loops closed without finalising their generators leave entries
+        for stale in [entry_key for entry_key in _clients if entry_key[0].is_closed()]:
+            del _clients[stale]
+        client = create()
+        closer = close_with_loop(key, client, close)
+        entry = _clients[key] = (client, closer)
+        # Started generators are the ones the loop finalises
+        asyncio.ensure_future(anext(closer), loop=loop)
+    return entry[0]
+
+
+async def close_with_loop(key, client, close):
+    try:
+        yield
+    finally:
+        _clients.pop(key, None)
+        await close(client)
@@ -0,0 +1,195 @@
+"""
+Query-string filtering and cursor pagination for the file listing API.
+
+Pages are keyed on the ``(uploaded, id)`` pair of the last row seen rather
+than an offset, so each page is an index range scan on ``file_owner_uploaded``
+no matter how deep the client has paged or how many files share a timestamp,
+and rows uploaded while paging do not shift later pages.
+"""
+
+from datetime import datetime, time, timedelta
+from django.core.exceptions import BadRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .listings import keyset_page, row_cursor
+
+# Upper bound on ``id=`` values in one request
+MAX_ID_FILTER = 500
+
+BOOLEAN_VALUES = {
+    "1": True,
+    "true": True,
+    "yes": True,
+    "0": False,
+    "false": False,
+    "no": False,
+}
+
+
+class FileCursorPagination:
+    """
+    Keyset pagination on ``(uploaded, id)``, newest first.
+
+    ``cursor`` asks for the rows after a pair and ``before`` for the rows
+    before one; the previous page is read as the next page in the opposite
+    order. Paginated rows must include ``uploaded`` and ``id``.
+    """
+
+    sort = "-date"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        after = request.query_params.get("cursor")
+        before = request.query_params.get("before")
+        try:
+            if before:
+                rows, more = keyset_page(queryset, self.sort[1:], before, size)
+                rows.reverse()
+            else:
+                rows, more = keyset_page(queryset, self.sort, after, size)
+        except BadRequest:
+            raise NotFound("Invalid cursor.")
+
+        if before:
+            self.next_cursor = rows and row_cursor(rows[-1], "uploaded")
+            self.previous_cursor = more and row_cursor(rows[0], "uploaded")
+        else:
+            self.next_cursor = more
+            self.previous_cursor = after and rows and row_cursor(rows[0], "uploaded")
+        return rows
+
+    def link(self, param, cursor):
+        if not cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "before" if param == "cursor" else "cursor")
+        return replace_query_param(url, param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.link("cursor", self.next_cursor),
+                "previous": self.link("before", self.previous_cursor),
+                "results": data,
+            }
+        )
+
+
+def parse_id_list(params, name="id"):
+    """Collect ids from repeated and/or comma-separated ``name`` parameters."""
+    ids = []
+    for value in params.getlist(name):
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise ValidationError({name: f"'{part}' is not a valid id."})
+            ids.append(int(part))
+    if len(ids) > MAX_ID_FILTER:
+        raise ValidationError({name: f"At most {MAX_ID_FILTER} ids are allowed."})
+    return ids
+
+
+def parse_boolean(params, name):
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return BOOLEAN_VALUES[value.lower()]
+    except KeyError:
+        raise ValidationError({name: "Expected true or false."})
+
+
+def parse_moment(params, name, end_of_day=False):
+    """
+    Parse an ISO date or datetime parameter into an aware datetime.
+
+    A bare date means the start of that day, or the start of the next day
+    when ``end_of_day`` is set, so ranges stay plain comparisons on the
+    indexed ``uploaded`` column.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        if end_of_day:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    elif moment is None:
+        raise ValidationError({name: "Expected an ISO 8601 date or datetime."})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_files(queryset, params):
+    """
+    Apply the listing filters from ``params`` to a File queryset.
+
+    Supported parameters: ``id`` (repeatable or comma-separated), ``folder``
+    (an id, or ``root`` for files outside any folder), ``processed``,
+    ``mime`` (a MIME type prefix such as ``image/``) and ``uploaded_after`` /
+    ``uploaded_before`` (ISO dates or datetimes; a date in
+    ``uploaded_before`` includes that whole day).
+    """
+    ids = parse_id_list(params)
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+
+    folder = params.get("folder")
+    if folder == "root":
+        queryset = queryset.filter(folder__isnull=True)
+    elif folder:
+        if not folder.isdigit():
+            raise ValidationError({"folder": "Expected a folder id or 'root'."})
+        queryset = queryset.filter(folder_id=int(folder))
+
+    processed = parse_boolean(params, "processed")
+    if processed is not None:
+        queryset = queryset.filter(processed=processed)
+
+    mime = params.get("mime")
+    if mime:
+        queryset = queryset.filter(mime_type__startswith=mime)
+
+    uploaded_after = parse_moment(params, "uploaded_after")
+    if uploaded_after is not None:
+        queryset = queryset.filter(uploaded__gte=uploaded_after)
+
+    uploaded_before = parse_moment(params, "uploaded_before", end_of_day=True)
+    if uploaded_before is not None:
+        queryset = queryset.filter(uploaded__lt=uploaded_before)
+
+    return queryset
+
+
+def parse_fields(params, allowed):
+    """Return the requested ``fields=`` subset of ``allowed``, or None for all."""
+    value = params.get("fields")
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {', '.join(unknown)}."})
+    return fields
@@ -4,6 +4,7 @@ from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import File
+from .quota import exceeds_quota
 
 
 class FileUploadForm(forms.ModelForm):
@@ -19,22 +20,12 @@ class FileUploadForm(forms.ModelForm):
     def clean_file(self):
         file = self.cleaned_data.get("file")
         if file:
-            # Check file size against user quota
-            max_size_mb = settings.MAX_STORAGE_MB
-            max_size_bytes = max_size_mb * 1024 * 1024
-
-            # Get user's total storage used
-            if self.user:
-                user_storage = File.objects.filter(owner=self.user).values_list(
-                    "size", flat=True
+            # Check if this file would exceed the user's quota
+            if self.user and exceeds_quota(self.user, file.size):
+                raise ValidationError(
+                    "This file would exceed your storage quota of "
+                    f"{settings.MAX_STORAGE_MB} MB."
                 )
-                total_used = sum(user_storage)
-
-                # Check if this file would exceed quota
-                if total_used + file.size > max_size_bytes:
-                    raise ValidationError(
-                        f"This file would exceed your storage quota of {max_size_mb} MB."
-                    )
 
             # Set instance attributes
             self.instance.name = file.name
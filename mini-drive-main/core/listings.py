@@ -0,0 +1,217 @@
+"""
+Versioned fragment caching and keyset paging for the dashboard and folder
+listings.
+
+Every listing (a folder, or a user's root) has a ``ListingVersion`` counter
+that is bumped when a file or subfolder in it is created, changed, shared or
+deleted. The rendered listing is cached under (template, folder, version),
+so a folder that has not changed since it was last viewed renders from the
+cache without querying its rows. Old versions simply age out of the cache.
+
+Cached HTML holds a placeholder instead of the CSRF token, which is filled
+in per request, and never outlives the first share link it displays.
+
+Listings show LISTING_PAGE_SIZE rows of folders and of files, sorted by name,
+size, type or date; the rest are fetched page by page as the user scrolls.
+Pages are keyed on the sort value and id of the last row seen rather than an
+offset, so every page is one index range scan however large the folder.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from django.core.cache import cache
+from django.core.exceptions import BadRequest
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, F, Q
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.safestring import mark_safe
+
+LISTING_CACHE_SECONDS = 24 * 60 * 60
+
+CSRF_PLACEHOLDER = "__listing_csrf_token__"
+
+LISTING_PAGE_SIZE = 100
+
+# ``sort`` values (prefix "-" to reverse) and the column each sorts on. Ties
+# are broken by id. Folders have no type, so they stay sorted by name.
+FILE_SORTS = {"name": "name", "size": "size", "type": "mime_type", "date": "uploaded"}
+FOLDER_SORTS = {"name": "name", "size": "total_size", "type": "name", "date": "created"}
+# Without a ``sort``: newest files first, folders by name
+DEFAULT_SORTS = {"file": "-date", "folder": "name"}
+
+
+def listing_version(owner_id, folder_id):
+    from .models import ListingVersion
+
+    version = (
+        ListingVersion.objects.filter(owner_id=owner_id, folder_id=folder_id)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def bump_listing(owner_id, folder_id):
+    """
+    Invalidate the cached listing of ``folder_id`` (None for the root).
+
+    Does nothing for a folder that no longer exists, as its listing is gone.
+    """
+    from .models import Folder, ListingVersion
+
+    versions = ListingVersion.objects.filter(owner_id=owner_id, folder_id=folder_id)
+    if versions.update(version=F("version") + 1):
+        return
+    if folder_id is not None and not Folder.objects.filter(id=folder_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            ListingVersion.objects.create(
+                owner_id=owner_id, folder_id=folder_id, version=1
+            )
+    except IntegrityError:
+        # Created concurrently
+        versions.update(version=F("version") + 1)
+
+
+def bump_listings(pairs):
+    """Bump every distinct ``(owner_id, folder_id)`` listing in ``pairs``."""
+    for owner_id, folder_id in set(pairs):
+        bump_listing(owner_id, folder_id)
+
+
+def listing_timeout(context):
+    """Cache lifetime of a rendered listing: until its first share link expires."""
+    expiries = [
+        token.expiry
+        for folder in context.get("folders", ())
+        for token in folder.foldersharetoken_set.all()
+    ] + [
+        token.expiry
+        for file in context.get("files", ())
+        for token in file.sharetoken_set.all()
+    ]
+    if not expiries:
+        return LISTING_CACHE_SECONDS
+    remaining = (min(expiries) - timezone.now()).total_seconds()
+    return max(0, min(LISTING_CACHE_SECONDS, int(remaining)))
+
+
+def render_listing(request, template_name, owner_id, folder_id, get_context, sort=""):
+    """
+    Return the rendered listing of a folder, from the cache when unchanged.
+
+    ``get_context`` is only called on a cache miss, so the folder and file
+    queries it builds are skipped entirely on a hit. Each ``sort`` of the
+    listing is cached separately.
+    """
+    version = listing_version(owner_id, folder_id)
+    key = (
+        f"core:listing:{template_name}:{owner_id}:{folder_id or 'root'}:{version}:"
+        f"{sort}:{request.scheme}://{request.get_host()}"
+    )
+    html = cache.get(key)
+    if html is None:
+        context = get_context()
+        html = render_to_string(
+            template_name,
+            {**context, "request": request, "csrf_token": CSRF_PLACEHOLDER},
+        )
+        timeout = listing_timeout(context)
+        if timeout:
+            cache.set(key, html, timeout)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def parse_sort(value):
+    """Return ``value`` if it is a valid ``sort`` parameter, else ``""``."""
+    if value and value.lstrip("-") in FILE_SORTS:
+        return value
+    return ""
+
+
+def sort_column(model, sort):
+    """Return ``(column, descending)`` that ``sort`` orders ``model`` by."""
+    sort = sort or DEFAULT_SORTS[model._meta.model_name]
+    sorts = FILE_SORTS if model._meta.model_name == "file" else FOLDER_SORTS
+    return sorts[sort.lstrip("-")], sort.startswith("-")
+
+
+def encode_cursor(value, pk):
+    if isinstance(value, datetime):
+        # Full precision: a truncated timestamp would skip rows
+        value = value.isoformat()
+    data = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor, field):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor + "=" * 4))
+        if isinstance(field, DateTimeField) and value is not None:
+            value = parse_datetime(value)
+        return value, int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise BadRequest("Invalid cursor.")
+
+
+def sort_listing(queryset, sort):
+    """
+    Order ``queryset`` by ``sort``, then id.
+
+    NULLs sort first ascending and last descending, as SQLite orders them,
+    so its indexes serve every sort.
+    """
+    column, descending = sort_column(queryset.model, sort)
+    if queryset.model._meta.get_field(column).null:
+        if descending:
+            return queryset.order_by(F(column).desc(nulls_last=True), "-id")
+        return queryset.order_by(F(column).asc(nulls_first=True), "id")
+    if descending:
+        return queryset.order_by(F(column).desc(), "-id")
+    return queryset.order_by(column, "id")
+
+
+def keyset_page(queryset, sort, cursor=None, size=LISTING_PAGE_SIZE):
+    """
+    Return ``(rows, next_cursor)`` for the page of ``queryset`` after ``cursor``.
+
+    ``next_cursor`` is None on the last page. Rows may be model instances or
+    ``.values()`` dicts that include the sort column and ``id``.
+    """
+    queryset = sort_listing(queryset, sort)
+    column, descending = sort_column(queryset.model, sort)
+    field = queryset.model._meta.get_field(column)
+    if cursor:
+        value, pk = decode_cursor(cursor, field)
+        after = "lt" if descending else "gt"
+        if value is None:
+            rest = Q(**{f"{column}__isnull": True, f"id__{after}": pk})
+            if not descending:
+                rest |= Q(**{f"{column}__isnull": False})
+        else:
+            # The leading range keeps this a scan of the sort index
+            rest = Q(**{f"{column}__{after}e": value}) & (
+                Q(**{f"{column}__{after}": value}) | Q(**{f"id__{after}": pk})
+            )
+            if descending and field.null:
+                rest |= Q(**{f"{column}__isnull": True})
+        queryset = queryset.filter(rest)
+
+    rows = list(queryset[: size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, row_cursor(rows[-1], column)
+
+
+def row_cursor(row, column):
+    """The cursor positioned just after ``row`` in a listing sorted by ``column``."""
+    if isinstance(row, dict):
+        return encode_cursor(row[column], row["id"])
+    return encode_cursor(getattr(row, column), row.pk)
@@ -0,0 +1,114 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries only the features that use them should import
+HEAVY_MODULES = ("numpy", "openai", "httpx", "fitz", "PIL", "google.generativeai")
+
+# Runs in a fresh interpreter, like a newly forked web worker
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns  # imports every view module
+boot = time.perf_counter() - start
+boot_rss = rss_mb()
+
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+request_start = time.perf_counter()
+status = Client().get(sys.argv[1]).status_code
+first_request = time.perf_counter() - request_start
+
+print(json.dumps({
+    "boot": boot,
+    "boot_rss": boot_rss,
+    "first_request": first_request,
+    "rss": rss_mb(),
+    "status": status,
+    "heavy": [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh interpreters that load the web application and serve one "
+        "request, and report start-up time, resident memory and which heavy "
+        "libraries were imported. Exits non-zero when a limit is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Processes to start.")
+        parser.add_argument(
+            "--path", default="/login/", help="URL of the first request."
+        )
+        parser.add_argument(
+            "--max-boot-ms", type=float, help="Fail above this median boot time."
+        )
+        parser.add_argument(
+            "--max-rss-mb", type=float, help="Fail above this median boot RSS."
+        )
+        parser.add_argument(
+            "--allow-heavy",
+            action="store_true",
+            help="Don't fail when a heavy library is imported at start-up.",
+        )
+
+    def handle(
+        self, *args, runs, path, max_boot_ms, max_rss_mb, allow_heavy, **options
+    ):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        results = []
+        for _ in range(runs):
+            probe = subprocess.run(
+                [sys.executable, "-c", PROBE, path, json.dumps(HEAVY_MODULES)],
+                cwd=settings.BASE_DIR,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if probe.returncode:
+                raise CommandError(f"Start-up failed:\n{probe.stderr}")
+            results.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+
+        def median(key, scale=1):
+            return statistics.median(result[key] for result in results) * scale
+
+        boot_ms = median("boot", 1000)
+        boot_rss = median("boot_rss")
+        heavy = sorted({name for result in results for name in result["heavy"]})
+        self.stdout.write(
+            f"boot: {boot_ms:.0f} ms, {boot_rss:.1f} MB RSS (median of {runs})"
+        )
+        self.stdout.write(
+            f"first request to {path} (HTTP {results[0]['status']}): "
+            f"{median('first_request', 1000):.0f} ms, {median('rss'):.1f} MB RSS"
+        )
+        self.stdout.write(f"heavy libraries loaded: {', '.join(heavy) or 'none'}")
+
+        failures = []
+        if max_boot_ms is not None and boot_ms > max_boot_ms:
+            failures.append(f"Boot took {boot_ms:.0f} ms, over {max_boot_ms:.0f} ms.")
+        if max_rss_mb is not None and boot_rss > max_rss_mb:
+            failures.append(f"Boot RSS is {boot_rss:.1f} MB, over {max_rss_mb:.1f} MB.")
+        if heavy and not allow_heavy:
+            failures.append(f"Imported at start-up: {', '.join(heavy)}.")
+        if failures:
+            raise CommandError("\n".join(failures))
@@ -0,0 +1,184 @@
+import asyncio
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.models import Embedding, File
+from .fake_openai_server import fake_embedding, start_server
+
+DIMENSIONS = 256
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the I/O-bound views (search and download) in one process, "
+        "served the WSGI way (a fixed number of worker threads, one request "
+        "each) and the ASGI way (one event loop), on a throwaway database with "
+        "a local stand-in for the embeddings API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 8, 32],
+            help="Concurrent clients to try.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=64, help="Requests per run."
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=1,
+            help="Requests a WSGI worker handles at once (1 for a sync worker).",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.1,
+            help="Seconds the embeddings stand-in takes to answer.",
+        )
+        parser.add_argument("--files", type=int, default=100, help="Files to search.")
+        parser.add_argument(
+            "--file-mb", type=float, default=4, help="Size of the downloaded file."
+        )
+        parser.add_argument(
+            "--client-mb-per-s",
+            type=float,
+            default=40,
+            help="Bandwidth of each client reading a response.",
+        )
+
+    def handle(self, *args, **options):
+        server = start_server(delay=options["latency"], dimensions=DIMENSIONS)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root,
+                OPENAI_API_KEY="stand-in",
+                OPENAI_BASE_URL=base_url,
+                COMPRESS_AT_REST=False,
+            ):
+                urls = self.seed(options["files"], options["file_mb"])
+                self.run(urls, options)
+        finally:
+            server.shutdown()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, count, file_mb):
+        user = User.objects.create_user("bench", password="bench")
+        words = ["report", "invoice", "holiday", "budget", "recipe", "contract"]
+        files = File.objects.bulk_create(
+            File(
+                owner=user,
+                name=f"{words[i % len(words)]}-{i}.txt",
+                file=f"files/{i}.txt",
+                size=1,
+                processed=True,
+            )
+            for i in range(count)
+        )
+        Embedding.objects.bulk_create(
+            Embedding(
+                file=file,
+                vector=fake_embedding(file.name, DIMENSIONS),
+                dimension=DIMENSIONS,
+            )
+            for file in files
+        )
+
+        download = File(owner=user, name="large.bin", processed=True)
+        download.size = int(file_mb * 1024 * 1024)
+        download.file.save("large.bin", ContentFile(b"\0" * download.size), save=False)
+        download.save()
+
+        client = Client()
+        client.force_login(user)
+        self.cookies = client.cookies
+        return {
+            "search_api": "/api/search/?q=budget+report",
+            "download_file": f"/download/{download.id}/",
+        }
+
+    def run(self, urls, options):
+        threads = options["wsgi_threads"]
+        self.bandwidth = options["client_mb_per_s"] * 1024 * 1024
+        self.stdout.write(
+            f"{'endpoint':<15}{'clients':>8}"
+            f"{'WSGI req/s':>12}{'p95 ms':>9}{'ASGI req/s':>12}{'p95 ms':>9}"
+        )
+        for name, url in urls.items():
+            for clients in options["concurrency"]:
+                wsgi = self.run_wsgi(url, clients, options["requests"], threads)
+                asgi = asyncio.run(self.run_asgi(url, clients, options["requests"]))
+                self.stdout.write(
+                    f"{name:<15}{clients:>8}"
+                    f"{wsgi[0]:>12.1f}{wsgi[1]:>9.0f}{asgi[0]:>12.1f}{asgi[1]:>9.0f}"
+                )
+
+    def summarize(self, latencies, elapsed):
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0
+        return len(latencies) / elapsed, p95 * 1000
+
+    def run_wsgi(self, url, clients, requests, threads):
+        # Clients queue for one of the worker's request threads
+        workers = threading.Semaphore(threads)
+
+        def client_loop(count):
+            client = Client()
+            client.cookies = self.cookies
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                with workers:
+                    response = client.get(url)
+                    assert response.status_code == 200, response.status_code
+                    # A sync worker is busy until the client has read it all
+                    if response.streaming:
+                        for chunk in response.streaming_content:
+                            time.sleep(len(chunk) / self.bandwidth)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(client_loop, self.split(requests, clients)))
+        return self.summarize(sum(results, []), time.perf_counter() - start)
+
+    async def run_asgi(self, url, clients, requests):
+        async def client_loop(count):
+            client = AsyncClient()
+            client.cookies = self.cookies
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(url)
+                assert response.status_code == 200, response.status_code
+                if response.streaming:
+                    async for chunk in response.streaming_content:
+                        await asyncio.sleep(len(chunk) / self.bandwidth)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(client_loop(count) for count in self.split(requests, clients))
+        )
+        return self.summarize(sum(results, []), time.perf_counter() - start)
+
+    def split(self, requests, clients):
+        return [requests // clients + (i < requests % clients) for i in range(clients)]
@@ -0,0 +1,87 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.models import File
+from core.serializers import FileListSerializer, FileSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows per second of the DRF FileSerializer and the values()-based "
+        "FileListSerializer on a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=10000, help="Number of files to seed."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Runs per serializer; best is kept."
+        )
+
+    def handle(self, *args, rows, repeat, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(rows)
+            self.run(rows, repeat)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, rows):
+        user = User.objects.create_user("bench", password="bench")
+        File.objects.bulk_create(
+            (
+                File(
+                    owner=user,
+                    name=f"file-{i}.txt",
+                    file=f"files/file-{i}.txt",
+                    size=1024 + i,
+                    mime_type="text/plain",
+                    thumb=f"thumbs/thumb-{i}.png" if i % 2 else None,
+                    processed=True,
+                )
+                for i in range(rows)
+            ),
+            batch_size=1000,
+        )
+        self.user = user
+
+    def run(self, rows, repeat):
+        request = RequestFactory().get("/api/files/")
+        request.user = self.user
+        queryset = File.objects.filter(owner=self.user).order_by("-uploaded", "-id")
+
+        def drf():
+            files = queryset.select_related("owner")
+            return FileSerializer(files, many=True, context={"request": request}).data
+
+        def fast():
+            serializer = FileListSerializer(request)
+            return serializer.to_representation(serializer.rows(queryset))
+
+        results = {}
+        for name, serialize in (("FileSerializer", drf), ("FileListSerializer", fast)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = serialize()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = (best, data)
+            self.stdout.write(
+                f"{name}: {len(data)} rows in {best * 1000:.1f} ms "
+                f"({len(data) / best:,.0f} rows/s)"
+            )
+
+        drf_time, drf_data = results["FileSerializer"]
+        fast_time, fast_data = results["FileListSerializer"]
+        if [dict(row) for row in drf_data] != fast_data:
+            raise CommandError("FileListSerializer output differs from FileSerializer.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Identical output, {drf_time / fast_time:.1f}x faster.")
+        )
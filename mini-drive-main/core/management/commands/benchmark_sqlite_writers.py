@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.db import UpdateBuffer, apply_sqlite_pragmas
+from core.models import File
+
+MODES = ("stock", "wal", "wal+coalesced")
+
+
+def writer(mode, worker, file_ids, batch_size, results):
+    """Flip ``processed`` on each of ``file_ids``, one write per row or batched."""
+    connections.close_all()
+    if mode == "stock":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=DELETE")
+            cursor.execute("PRAGMA synchronous=FULL")
+    else:
+        apply_sqlite_pragmas(connection)
+
+    locked = 0
+    start = time.perf_counter()
+    if mode == "wal+coalesced":
+        with UpdateBuffer(File, max_size=batch_size) as updates:
+            for file_id in file_ids:
+                updates.add(file_id, processed=True)
+    else:
+        for file_id in file_ids:
+            try:
+                File.objects.filter(id=file_id).update(processed=True)
+            except OperationalError:
+                locked += 1
+    results.put((worker, len(file_ids) - locked, locked, time.perf_counter() - start))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure File writer throughput with N concurrent processes on a "
+        "throwaway SQLite database, with stock settings, WAL mode and WAL "
+        "mode plus coalesced writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            nargs="+",
+            default=[1, 4, 8],
+            help="Writer process counts to try.",
+        )
+        parser.add_argument(
+            "--writes", type=int, default=500, help="Row updates per process."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Rows per coalesced batch."
+        )
+
+    def handle(self, *args, processes, writes, batch_size, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only applies to SQLite.")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("This benchmark needs the 'fork' start method.")
+
+        # Writers need a database file they can all open, not :memory:
+        workdir = tempfile.mkdtemp()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench.db")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = User.objects.create_user("bench", password="bench")
+            File.objects.bulk_create(
+                (
+                    File(owner=user, name=f"{i}.txt", file=f"files/{i}.txt", size=1)
+                    for i in range(max(processes) * writes)
+                ),
+                batch_size=1000,
+            )
+            ids = list(File.objects.order_by("id").values_list("id", flat=True))
+
+            self.stdout.write(f"{'mode':<15}{'procs':>6}{'writes/s':>12}{'locked':>8}")
+            for mode in MODES:
+                for count in processes:
+                    File.objects.update(processed=False)
+                    self.run(mode, count, writes, ids, batch_size)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run(self, mode, count, writes, ids, batch_size):
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        connections.close_all()
+        workers = [
+            context.Process(
+                target=writer,
+                args=(mode, n, ids[n * writes : (n + 1) * writes], batch_size, results),
+            )
+            for n in range(count)
+        ]
+        start = time.perf_counter()
+        for process in workers:
+            process.start()
+        done = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        written = sum(result[1] for result in done)
+        locked = sum(result[2] for result in done)
+        self.stdout.write(f"{mode:<15}{count:>6}{written / elapsed:>12,.0f}{locked:>8}")
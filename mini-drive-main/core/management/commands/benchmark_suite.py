@@ -0,0 +1,366 @@
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from core.models import File, Folder
+from core.tasks import postprocess_file
+from . import fake_gemini_server, fake_openai_server
+from .seed_data import TOPICS, make_content, seed
+
+BENCHMARKS = (
+    "dashboard",
+    "folder",
+    "file_list_api",
+    "search",
+    "chat",
+    "upload",
+    "postprocess",
+)
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds."""
+    ms = [seconds * 1000 for seconds in latencies]
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    else:
+        cuts = ms * 99
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 2),
+        "p50_ms": round(statistics.median(ms), 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+    }
+
+
+def git_revision():
+    """Return ``(commit, dirty)`` of the checkout, or ``(None, None)``."""
+
+    def git(*args):
+        return subprocess.run(
+            ["git", *args],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    try:
+        return git("rev-parse", "HEAD"), bool(git("status", "--porcelain"))
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+class Command(BaseCommand):
+    help = (
+        "End-to-end benchmarks: dashboard and folder rendering, FileListAPI "
+        "throughput, search and chat latency, uploads and postprocess_file, on a "
+        "seeded throwaway database with local stand-ins for the embeddings and "
+        "Gemini APIs. Writes machine-readable results to compare across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only", nargs="+", choices=BENCHMARKS, help="Benchmarks to run."
+        )
+        parser.add_argument("--output", help="Write the results as JSON here.")
+        parser.add_argument(
+            "--compare", help="Earlier results (JSON) to print changes against."
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=30, help="Requests per benchmark."
+        )
+        parser.add_argument("--users", type=int, default=3)
+        parser.add_argument("--files-per-user", type=int, default=300)
+        parser.add_argument("--folders-per-user", type=int, default=20)
+        parser.add_argument("--dimensions", type=int, default=1536)
+        parser.add_argument(
+            "--page-size", type=int, default=100, help="FileListAPI page size."
+        )
+        parser.add_argument(
+            "--files", type=int, default=40, help="Files to upload and to process."
+        )
+        parser.add_argument(
+            "--embed-latency",
+            type=float,
+            default=0.02,
+            help="Seconds the embeddings stand-in takes to answer.",
+        )
+        parser.add_argument(
+            "--llm-latency",
+            type=float,
+            default=0.0,
+            help="Seconds between words from the Gemini stand-in.",
+        )
+
+    def handle(self, *args, **options):
+        embeddings = fake_openai_server.start_server(
+            delay=options["embed_latency"], dimensions=options["dimensions"]
+        )
+        gemini = fake_gemini_server.start_server(delay=options["llm_latency"])
+        for server in (embeddings, gemini):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root,
+                OPENAI_API_KEY="stand-in",
+                OPENAI_BASE_URL=f"http://127.0.0.1:{embeddings.server_port}/v1",
+                GEMINI_API_KEY="stand-in",
+                GEMINI_API_BASE=f"http://127.0.0.1:{gemini.server_port}",
+            ):
+                start = time.perf_counter()
+                users = seed(
+                    users=options["users"],
+                    files_per_user=options["files_per_user"],
+                    folders_per_user=options["folders_per_user"],
+                    dimensions=options["dimensions"],
+                    prefix="bench",
+                )
+                self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f} s")
+                self.user = users[0]
+                self.client = Client()
+                self.client.force_login(self.user)
+
+                results = {}
+                for name in options["only"] or BENCHMARKS:
+                    results.update(getattr(self, f"bench_{name}")(options))
+        finally:
+            embeddings.shutdown()
+            gemini.shutdown()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        commit, dirty = git_revision()
+        report = {
+            "meta": {
+                "commit": commit,
+                "dirty": dirty,
+                "timestamp": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "machine": platform.machine(),
+            },
+            "config": {
+                key: options[key]
+                for key in (
+                    "iterations",
+                    "users",
+                    "files_per_user",
+                    "folders_per_user",
+                    "dimensions",
+                    "page_size",
+                    "files",
+                    "embed_latency",
+                    "llm_latency",
+                )
+            },
+            "results": results,
+        }
+        self.print_results(results)
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(f"Results written to {options['output']}")
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            self.print_comparison(baseline, report)
+
+    def measure(self, request, iterations, before=None):
+        """Time ``request()`` and count its queries, ``iterations`` times."""
+        latencies, queries = [], []
+        for _ in range(iterations):
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request()
+                latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            queries.append(len(captured))
+        return {**summarize(latencies), "queries": max(queries)}
+
+    def bench_dashboard(self, options):
+        request = partial(self.client.get, "/")
+        return {
+            "dashboard": self.measure(request, options["iterations"], cache.clear),
+            "dashboard_cached": self.measure(request, options["iterations"]),
+        }
+
+    def bench_folder(self, options):
+        # The user's busiest folder
+        folder = (
+            Folder.objects.filter(owner=self.user)
+            .annotate(file_count=Count("files"))
+            .order_by("-file_count")
+            .first()
+        )
+        request = partial(self.client.get, f"/folder/{folder.id}/")
+        return {
+            "folder": self.measure(request, options["iterations"], cache.clear),
+            "folder_cached": self.measure(request, options["iterations"]),
+        }
+
+    def bench_file_list_api(self, options):
+        """Walk every page of the user's files until ``iterations`` pages."""
+        latencies, rows = [], 0
+        url = f"/api/files/?page_size={options['page_size']}"
+        while len(latencies) < options["iterations"]:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            page = response.json()
+            rows += len(page["results"])
+            url = page["next"] or f"/api/files/?page_size={options['page_size']}"
+        return {
+            "file_list_api": {
+                **summarize(latencies),
+                "rows_per_s": round(rows / sum(latencies), 1),
+                "pages_per_s": round(len(latencies) / sum(latencies), 1),
+            }
+        }
+
+    def bench_search(self, options):
+        words = [word for topic in TOPICS.values() for word in topic.split()]
+        queries = iter(
+            f"{words[i % len(words)]} {words[i * 7 % len(words)]}"
+            for i in range(options["iterations"])
+        )
+
+        def request():
+            return self.client.get("/api/search/", {"q": next(queries)})
+
+        return {"search": self.measure(request, options["iterations"])}
+
+    def bench_chat(self, options):
+        """Grounded chat: time to the first streamed words and to the end."""
+
+        async def run():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            first, total = [], []
+            words = list(TOPICS["finance"].split())
+            for i in range(options["iterations"]):
+                prompt = f"What is my {words[i % len(words)]} plan?"
+                start = time.perf_counter()
+                response = await client.get(
+                    "/chat_with_gemini/", {"prompt": prompt, "context": "true"}
+                )
+                assert response.status_code == 200, response.status_code
+                first_words = None
+                async for event in response.streaming_content:
+                    if first_words is None and event.startswith(b"data:"):
+                        first_words = time.perf_counter() - start
+                assert event.startswith(b"event: done"), event
+                first.append(first_words)
+                total.append(time.perf_counter() - start)
+            return first, total
+
+        first, total = asyncio.run(run())
+        return {
+            "chat_first_words": summarize(first),
+            "chat_reply": summarize(total),
+        }
+
+    def bench_upload(self, options):
+        """Single-file API uploads, including the (eager) postprocess_file."""
+        uploads = self.make_files(options["files"], prefix="upload")
+        latencies = []
+        for name, data in uploads:
+            start = time.perf_counter()
+            response = self.client.post(
+                "/api/upload/", {"file": SimpleUploadedFile(name, data)}
+            )
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.content
+        total_bytes = sum(len(data) for name, data in uploads)
+        return {
+            "upload": {
+                **summarize(latencies),
+                "files_per_s": round(len(uploads) / sum(latencies), 2),
+                "mb_per_s": round(total_bytes / 1024 / 1024 / sum(latencies), 2),
+            }
+        }
+
+    def bench_postprocess(self, options):
+        files = []
+        for name, data in self.make_files(options["files"], prefix="process"):
+            file = File(owner=self.user, name=name, size=len(data))
+            file.file.save(name, ContentFile(data), save=False)
+            file.save()
+            files.append(file)
+
+        latencies = []
+        for file in files:
+            start = time.perf_counter()
+            result = postprocess_file(file.id)
+            latencies.append(time.perf_counter() - start)
+            assert result["status"] == "success", result
+        return {
+            "postprocess": {
+                **summarize(latencies),
+                "files_per_s": round(len(files) / sum(latencies), 2),
+            }
+        }
+
+    def make_files(self, count, prefix):
+        """``(name, bytes)`` of processable files: text, PDFs and images."""
+        rng = random.Random(count)
+        extensions = ("txt", "pdf", "md", "png", "json")
+        files = []
+        for i in range(count):
+            extension = extensions[i % len(extensions)]
+            topic = rng.choice(list(TOPICS))
+            data, text = make_content(rng, extension, topic, rng.randint(2, 32) * 1024)
+            files.append((f"{prefix}-{topic}-{i}.{extension}", data))
+        return files
+
+    def print_results(self, results):
+        for name, metrics in results.items():
+            line = ", ".join(
+                f"{key} {value}" for key, value in metrics.items() if key != "count"
+            )
+            self.stdout.write(f"{name:<18} {line}")
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write(
+            f"\nChanges since {(baseline['meta'].get('commit') or 'baseline')[:12]}"
+        )
+        if baseline.get("config") != report["config"]:
+            self.stdout.write(self.style.WARNING("Runs used different settings."))
+        for name, metrics in report["results"].items():
+            old = baseline["results"].get(name, {})
+            for key, value in metrics.items():
+                if key == "count" or not old.get(key):
+                    continue
+                change = (value - old[key]) / old[key] * 100
+                self.stdout.write(
+                    f"{name:<18} {key:<12} {old[key]:>10} -> {value:<10} "
+                    f"({change:+.1f}%)"
+                )
@@ -0,0 +1,29 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.tasks import compute_related_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every file's most similar files (by embedding) for one user or "
+        "for all users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username; default every user.")
+
+    def handle(self, *args, user, **options):
+        user_id = None
+        if user:
+            try:
+                user_id = get_user_model().objects.get(username=user).id
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {user}.")
+        start = time.perf_counter()
+        rows = compute_related_files(user_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {rows} related files in {time.perf_counter() - start:.1f} s."
+            )
+        )
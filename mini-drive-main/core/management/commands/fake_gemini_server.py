@@ -0,0 +1,74 @@
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+STREAM_PATH = re.compile(r"^/v1beta/models/[^/:]+:streamGenerateContent$")
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answer ``streamGenerateContent`` calls like the Gemini REST API does.
+
+    The reply echoes the prompt and the number of grounding excerpts, one
+    word per SSE event, ``delay`` seconds apart.
+    """
+
+    delay = 0.05
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not STREAM_PATH.match(path) or "alt=sse" not in query:
+            self.send_error(404)
+            return
+
+        prompt = body["contents"][-1]["parts"][0]["text"]
+        instruction = body.get("systemInstruction", {}).get("parts", [{}])[0]
+        excerpts = instruction.get("text", "").count("\n[")
+        reply = f"You asked: {prompt} (grounded in {excerpts} excerpts)"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in reply.split(" "):
+            event = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, delay=0.05):
+    """Bind a stand-in server to ``port`` (0 picks a free one); serve it yourself."""
+    handler = type("Handler", (FakeGeminiHandler,), {"delay": delay})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for the Gemini streaming API. Point "
+        "GEMINI_API_BASE at it to develop and test chat without an API key."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--delay", type=float, default=0.05, help="Seconds between words."
+        )
+
+    def handle(self, *args, port, delay, **options):
+        server = start_server(port, delay)
+        self.stdout.write(f"Fake Gemini API on http://127.0.0.1:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
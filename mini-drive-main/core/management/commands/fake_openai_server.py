@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import json
+import math
+import re
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+
+WORD_RE = re.compile(r"\w+")
+
+
+def fake_embedding(text, dimensions):
+    """Hashed bag-of-words vector: texts sharing words point the same way."""
+    vector = [0.0] * dimensions
+    for word in WORD_RE.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answer ``POST /v1/embeddings`` like the OpenAI API does.
+
+    Vectors are deterministic, so search results are stable across runs, and
+    each response is held back ``delay`` seconds to stand in for API latency.
+    """
+
+    delay = 0.1
+    dimensions = 1536
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.rstrip("/") != "/v1/embeddings":
+            self.send_error(404)
+            return
+
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), self.dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(str(text).split()) for text in inputs)
+        payload = json.dumps(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        ).encode()
+
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, delay=0.1, dimensions=1536):
+    """Bind a stand-in server to ``port`` (0 picks a free one); serve it yourself."""
+    handler = type(
+        "Handler", (FakeOpenAIHandler,), {"delay": delay, "dimensions": dimensions}
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler, bind_and_activate=False)
+    # Room for many concurrent clients connecting at once
+    server.request_queue_size = 128
+    server.server_bind()
+    server.server_activate()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for the OpenAI embeddings API. Point "
+        "OPENAI_BASE_URL at it to develop, test and benchmark search without "
+        "an API key."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8766)
+        parser.add_argument(
+            "--delay", type=float, default=0.1, help="Seconds before each reply."
+        )
+        parser.add_argument("--dimensions", type=int, default=1536)
+
+    def handle(self, *args, port, delay, dimensions, **options):
+        server = start_server(port, delay, dimensions)
+        self.stdout.write(f"Fake OpenAI API on http://127.0.0.1:{port}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
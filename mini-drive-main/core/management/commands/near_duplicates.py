@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import RelatedFile
+
+
+class Command(BaseCommand):
+    help = (
+        "List pairs of files whose embeddings are nearly identical, from the "
+        "precomputed related files (see compute_related_files)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only this user's files.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=settings.NEAR_DUPLICATE_SIMILARITY,
+            help="Minimum cosine similarity (default NEAR_DUPLICATE_SIMILARITY).",
+        )
+        parser.add_argument("--limit", type=int, default=100)
+
+    def handle(self, *args, user, threshold, limit, **options):
+        pairs = (
+            RelatedFile.objects.filter(similarity__gte=threshold)
+            .select_related("file__owner", "related")
+            .order_by("-similarity")
+        )
+        if user:
+            pairs = pairs.filter(file__owner__username=user)
+
+        # Each pair is usually stored in both directions
+        seen = set()
+        for pair in pairs.iterator():
+            key = frozenset((pair.file_id, pair.related_id))
+            if key in seen:
+                continue
+            seen.add(key)
+            self.stdout.write(
+                f"{pair.similarity:.4f}  {pair.file.owner.username}: "
+                f"{pair.file.name} ({pair.file_id}) ~ "
+                f"{pair.related.name} ({pair.related_id})"
+            )
+            if len(seen) >= limit:
+                break
+        self.stdout.write(f"{len(seen)} near-duplicate pairs at {threshold} or above.")
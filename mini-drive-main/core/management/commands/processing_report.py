@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q, Sum
+from core.models import ProcessingRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise file processing by MIME type (failures, time and CPU) and "
+        "list the files that cost the most CPU to process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=10, help="Costliest files to list."
+        )
+        parser.add_argument(
+            "--mime", help="Only files whose MIME type starts with this."
+        )
+
+    def handle(self, *args, top, mime, **options):
+        records = ProcessingRecord.objects.all()
+        if mime:
+            records = records.filter(file__mime_type__startswith=mime)
+
+        rows = (
+            records.values("file__mime_type")
+            .annotate(
+                files=Count("id"),
+                failed=Count("id", filter=Q(status="failed")),
+                partial=Count("id", filter=Q(status="partial")),
+                retries=Sum("retries"),
+                avg_ms=Avg("total_ms"),
+                avg_cpu_ms=Avg("cpu_ms"),
+                max_cpu_ms=Max("cpu_ms"),
+            )
+            .order_by("-failed", "-partial", "-files")
+        )
+        self.stdout.write(
+            f"{'type':<28}{'files':>7}{'failed':>8}{'partial':>9}{'retries':>9}"
+            f"{'avg ms':>9}{'avg CPU':>9}{'max CPU':>9}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['file__mime_type'] or '-':<28}{row['files']:>7}"
+                f"{row['failed']:>8}{row['partial']:>9}{row['retries']:>9}"
+                f"{row['avg_ms']:>9.0f}{row['avg_cpu_ms']:>9.0f}"
+                f"{row['max_cpu_ms']:>9.0f}"
+            )
+
+        self.stdout.write(f"\nCostliest {top} files by CPU time:")
+        costliest = records.select_related("file").order_by("-cpu_ms")[:top]
+        for record in costliest:
+            detail = f"{record.pages} pages, " if record.pages is not None else ""
+            self.stdout.write(
+                f"{record.cpu_ms:>8.0f} ms CPU  {record.file.name} (file "
+                f"{record.file_id}, {detail}{record.bytes_in} bytes, "
+                f"{record.get_status_display().lower()})"
+            )
+
+        errors = (
+            records.exclude(error_class="")
+            .values("failed_stage", "error_class")
+            .annotate(files=Count("id"))
+            .order_by("-files")
+        )
+        if errors:
+            self.stdout.write("\nErrors:")
+            for row in errors:
+                self.stdout.write(
+                    f"{row['files']:>7}  {row['failed_stage'] or '-'}: "
+                    f"{row['error_class']}"
+                )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.tasks import purge_storage
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs queued for removal by folder deletion."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        purged = purge_storage(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} blobs."))
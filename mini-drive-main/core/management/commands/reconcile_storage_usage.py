@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.core.management.base import BaseCommand
+from core.models import File, StorageUsage
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every user's StorageUsage row from the File table and "
+        "repair any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted rows without fixing them.",
+        )
+
+    def handle(self, *args, dry_run, **options):
+        actual = {
+            row["owner"]: (row["bytes_used"], row["file_count"])
+            for row in File.objects.order_by()
+            .values("owner")
+            .annotate(bytes_used=Sum("size"), file_count=Count("id"))
+        }
+        stored = {
+            row[0]: (row[1], row[2])
+            for row in StorageUsage.objects.values_list(
+                "user_id", "bytes_used", "file_count"
+            )
+        }
+
+        user_ids = get_user_model().objects.values_list("id", flat=True)
+        fixes = []
+        for user_id in user_ids:
+            expected = actual.get(user_id, (0, 0))
+            if stored.get(user_id) != expected:
+                self.stdout.write(
+                    f"User {user_id}: stored {stored.get(user_id)}, actual {expected}"
+                )
+                fixes.append(
+                    StorageUsage(
+                        user_id=user_id, bytes_used=expected[0], file_count=expected[1]
+                    )
+                )
+
+        if fixes and not dry_run:
+            with transaction.atomic():
+                StorageUsage.objects.bulk_create(
+                    fixes,
+                    update_conflicts=True,
+                    unique_fields=["user"],
+                    update_fields=["bytes_used", "file_count"],
+                )
+
+        verb = "would be" if dry_run else "were"
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(fixes)} usage rows {verb} repaired.")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.totals import recompute_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every folder's recursive size and file count from the File "
+        "table, bottom-up, and repair any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted folders without fixing them.",
+        )
+
+    def handle(self, *args, dry_run, **options):
+        with transaction.atomic():
+            fixes = recompute_totals(save=not dry_run)
+        for folder_id, stored, actual in fixes:
+            self.stdout.write(f"Folder {folder_id}: stored {stored}, actual {actual}")
+
+        verb = "would be" if dry_run else "were"
+        self.stdout.write(self.style.SUCCESS(f"{len(fixes)} folders {verb} repaired."))
@@ -0,0 +1,287 @@
+import io
+import json
+import math
+import mimetypes
+import random
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from core.listings import bump_listings
+from core.models import Embedding, File, Folder
+from core.totals import recompute_totals
+from .fake_openai_server import fake_embedding
+
+TOPICS = {
+    "finance": "budget invoice expense revenue forecast quarter audit tax payroll",
+    "travel": "flight hotel itinerary passport booking museum beach train visa",
+    "cooking": "recipe banana bread oven flour garlic pasta sauce dinner",
+    "engineering": "design review deploy server latency database cache release",
+    "health": "doctor appointment vitamin exercise sleep diet clinic therapy",
+    "school": "homework lecture exam essay chapter grade syllabus thesis",
+}
+FILLER = "the a of and to in for with on from this that our your".split()
+
+# Extension, relative frequency
+FILE_TYPES = [
+    ("txt", 25),
+    ("md", 10),
+    ("json", 10),
+    ("csv", 10),
+    ("pdf", 20),
+    ("png", 15),
+    ("bin", 10),
+]
+EXTENSIONS, WEIGHTS = zip(*FILE_TYPES)
+
+# Mirrors postprocess_file, which embeds the first 8000 characters
+TEXT_LIMIT = 8000
+
+
+def sentence(rng, topic):
+    words = TOPICS[topic].split()
+    picked = [rng.choice(words if i % 2 else FILLER) for i in range(rng.randint(6, 14))]
+    return " ".join(picked).capitalize() + "."
+
+
+def paragraph(rng, topic, size):
+    parts, length = [], 0
+    while length < size:
+        parts.append(sentence(rng, topic))
+        length += len(parts[-1]) + 1
+    return " ".join(parts)
+
+
+def make_content(rng, extension, topic, size):
+    """Return ``(bytes, extracted_text)`` for a file of roughly ``size`` bytes."""
+    if extension == "txt":
+        text = paragraph(rng, topic, size)
+    elif extension == "md":
+        text = f"# {topic.title()} notes\n\n" + "\n\n".join(
+            paragraph(rng, topic, 400) for _ in range(max(1, size // 400))
+        )
+    elif extension == "json":
+        rows = [
+            {"id": i, "topic": topic, "note": sentence(rng, topic)}
+            for i in range(max(1, size // 90))
+        ]
+        text = json.dumps(rows, indent=1)
+    elif extension == "csv":
+        lines = ["id,topic,amount,note"] + [
+            f"{i},{topic},{rng.randint(1, 9999)},{sentence(rng, topic)}"
+            for i in range(max(1, size // 80))
+        ]
+        text = "\n".join(lines)
+    elif extension == "pdf":
+        return make_pdf(rng, topic, size)
+    elif extension == "png":
+        return make_png(rng, size), ""
+    else:
+        return rng.randbytes(size), ""
+    return text.encode(), text[:TEXT_LIMIT]
+
+
+def make_pdf(rng, topic, size):
+    import fitz  # PyMuPDF
+
+    document = fitz.open()
+    text = ""
+    # A page of text is a couple of kilobytes once compressed
+    for _ in range(min(max(1, size // 2000), 20)):
+        page_text = paragraph(rng, topic, 1500)
+        page = document.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), page_text, fontsize=10)
+        text += page_text + "\n"
+    data = document.tobytes(garbage=3, deflate=True)
+    document.close()
+    return data, text[:TEXT_LIMIT]
+
+
+def make_png(rng, size):
+    from PIL import Image
+
+    # Noise barely compresses: about three bytes per pixel
+    side = max(8, int(math.sqrt(size / 3)))
+    image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def seed_folders(rng, user, count, depth):
+    """Create ``count`` folders at most ``depth`` deep, one level at a time."""
+    folders = []
+    parents = [None]
+    for level in range(depth):
+        remaining = count - len(folders)
+        if remaining <= 0:
+            break
+        # Fill shallow levels first, like real trees
+        size = remaining if level == depth - 1 else max(1, remaining // 2)
+        created = Folder.objects.bulk_create(
+            Folder(
+                owner=user,
+                parent=rng.choice(parents),
+                name=f"{rng.choice(list(TOPICS)).title()} {len(folders) + i + 1}",
+            )
+            for i in range(size)
+        )
+        # bulk_create skips Folder.save, which maintains the path
+        for folder in created:
+            folder.path = Folder.build_path(folder.parent, folder.id)
+        Folder.objects.bulk_update(created, ["path"])
+        folders += created
+        parents = created
+    return folders
+
+
+def seed_files(rng, user, folders, count, min_kb, max_kb, dimensions, days):
+    storage = File._meta.get_field("file").storage
+    now = timezone.now()
+    files, texts = [], []
+    for i in range(count):
+        extension = rng.choices(EXTENSIONS, weights=WEIGHTS)[0]
+        topic = rng.choice(list(TOPICS))
+        # Log-uniform: many small files, a few large ones
+        size = int(1024 * math.exp(rng.uniform(math.log(min_kb), math.log(max_kb))))
+        data, text = make_content(rng, extension, topic, size)
+
+        name = f"{topic}-{rng.choice(TOPICS[topic].split())}-{i + 1}.{extension}"
+        compressed = hasattr(storage, "should_compress") and storage.should_compress(
+            name, len(data)
+        )
+        stored_name = storage.save(f"files/{name}", ContentFile(data))
+        files.append(
+            File(
+                owner=user,
+                folder=rng.choice([None] + folders),
+                name=name,
+                file=stored_name,
+                size=len(data),
+                stored_size=storage.size(stored_name),
+                encoding="gzip" if compressed else "",
+                mime_type=mimetypes.guess_type(name)[0],
+                processed=True,
+            )
+        )
+        texts.append(text)
+
+    with transaction.atomic():
+        files = File.objects.bulk_create(files, batch_size=500)
+        # auto_now_add overrode any upload date; spread them over ``days``
+        for file in files:
+            file.uploaded = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        File.objects.bulk_update(files, ["uploaded"], batch_size=500)
+        Embedding.objects.bulk_create(
+            (
+                Embedding(
+                    file=file,
+                    vector=fake_embedding(text, dimensions),
+                    dimension=dimensions,
+                    extracted_text=text,
+                )
+                for file, text in zip(files, texts)
+                if text
+            ),
+            batch_size=200,
+        )
+    return files
+
+
+def seed(
+    users=5,
+    files_per_user=200,
+    folders_per_user=20,
+    depth=3,
+    min_kb=1,
+    max_kb=64,
+    dimensions=1536,
+    days=365,
+    prefix="demo",
+    password="demo",
+    random_seed=0,
+):
+    """
+    Create users with folder trees, stored files and their embeddings.
+
+    Vectors come from ``fake_embedding``, so searches answered by the
+    ``fake_openai_server`` stand-in rank these files like real ones would.
+    Returns the created users.
+    """
+    rng = random.Random(random_seed)
+    usernames = [f"{prefix}{n + 1}" for n in range(users)]
+    if User.objects.filter(username__in=usernames).exists():
+        raise CommandError(f"Users named {prefix}N already exist; pick a --prefix.")
+
+    created = []
+    for username in usernames:
+        user = User.objects.create_user(username, password=password)
+        folders = seed_folders(rng, user, folders_per_user, depth)
+        files = seed_files(
+            rng, user, folders, files_per_user, min_kb, max_kb, dimensions, days
+        )
+        # Bulk inserts send no post_save, so invalidate the listings and
+        # fill in the folder totals here
+        bump_listings((user.id, file.folder_id) for file in files)
+        recompute_totals(Folder.objects.filter(owner=user))
+        created.append(user)
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users with realistic folder trees, files of mixed types and sizes, "
+        "and precomputed embeddings, for development and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--files-per-user", type=int, default=200)
+        parser.add_argument("--folders-per-user", type=int, default=20)
+        parser.add_argument(
+            "--depth", type=int, default=3, help="Maximum folder nesting."
+        )
+        parser.add_argument("--min-kb", type=float, default=1)
+        parser.add_argument("--max-kb", type=float, default=64)
+        parser.add_argument(
+            "--dimensions",
+            type=int,
+            default=1536,
+            help="Embedding size; match fake_openai_server --dimensions.",
+        )
+        parser.add_argument(
+            "--days", type=int, default=365, help="Spread upload dates this far back."
+        )
+        parser.add_argument("--prefix", default="demo", help="Username prefix.")
+        parser.add_argument("--password", default="demo")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        users = seed(
+            users=options["users"],
+            files_per_user=options["files_per_user"],
+            folders_per_user=options["folders_per_user"],
+            depth=options["depth"],
+            min_kb=options["min_kb"],
+            max_kb=options["max_kb"],
+            dimensions=options["dimensions"],
+            days=options["days"],
+            prefix=options["prefix"],
+            password=options["password"],
+            random_seed=options["seed"],
+        )
+        files = File.objects.filter(owner__in=users)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(users)} users, "
+                f"{Folder.objects.filter(owner__in=users).count()} folders, "
+                f"{files.count()} files and "
+                f"{Embedding.objects.filter(file__in=files).count()} embeddings "
+                f"in {time.perf_counter() - start:.1f} s. "
+                f"Log in as {users[0].username} / {options['password']}."
+            )
+        )
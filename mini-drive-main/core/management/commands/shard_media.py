@@ -0,0 +1,128 @@
+import os
+import posixpath
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import File
+from core.storage import is_sharded, shard_name
+
+# Moves made so far, one "old<TAB>new" line each, kept until a run completes
+JOURNAL_NAME = ".shard_media.journal"
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing files and thumbnails into the sharded media layout "
+        "(files/ab/cd/name) and update File.file/File.thumb. Safe to re-run: "
+        "rows that are already sharded are skipped, and blobs moved by an "
+        "interrupted run are found again through its journal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be moved without touching anything.",
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        moved = skipped = 0
+        last_id = 0
+        storage = File._meta.get_field("file").storage
+        journal_path = storage.path(JOURNAL_NAME)
+        self.journal = {}
+        if os.path.exists(journal_path):
+            with open(journal_path, encoding="utf-8") as journal:
+                self.journal = dict(
+                    line.rstrip("\n").split("\t", 1)
+                    for line in journal
+                    if "\t" in line
+                )
+        self.journal_file = None
+        if not dry_run:
+            self.journal_file = open(journal_path, "a", encoding="utf-8")
+
+        while True:
+            batch = list(
+                File.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "file", "thumb")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            changed = []
+            done = []  # (src, dst) pairs, used to undo moves if the batch fails
+            try:
+                with transaction.atomic():
+                    for file_obj in batch:
+                        updated = False
+                        for field in ("file", "thumb"):
+                            fieldfile = getattr(file_obj, field)
+                            if not fieldfile or is_sharded(fieldfile.name):
+                                continue
+                            new_name = self._move(
+                                fieldfile, file_obj.id, done, dry_run
+                            )
+                            if new_name:
+                                fieldfile.name = new_name
+                                updated = True
+                        if updated:
+                            changed.append(file_obj)
+                        else:
+                            skipped += 1
+
+                    if changed and not dry_run:
+                        File.objects.bulk_update(changed, ["file", "thumb"])
+            except Exception:
+                for src, dst in reversed(done):
+                    os.replace(dst, src)
+                raise
+
+            moved += len(changed)
+            self.stdout.write(f"Up to id {last_id}: {moved} moved, {skipped} skipped")
+
+        if self.journal_file:
+            self.journal_file.close()
+            os.remove(journal_path)
+        verb = "would be" if dry_run else "were"
+        self.stdout.write(self.style.SUCCESS(f"Done. {moved} files {verb} re-laid out."))
+
+    def _move(self, fieldfile, key, done, dry_run):
+        """Move one stored blob to its sharded name and return that name."""
+        storage = fieldfile.storage
+        name = fieldfile.name
+        # Keep the top-level directory only; this also collapses the old
+        # doubled "thumbs/thumbs/" prefix.
+        top = name.split("/", 1)[0] if "/" in name else ""
+        target = shard_name(posixpath.join(top, posixpath.basename(name)), key)
+
+        src = storage.path(name)
+        dst = storage.path(target)
+
+        if not os.path.exists(src):
+            # Moved by an earlier, interrupted run: only the journal knows
+            # where to, as the target may have been given a suffix
+            moved_to = self.journal.get(name)
+            if moved_to and storage.exists(moved_to):
+                return moved_to
+            self.stderr.write(f"Missing blob, leaving as is: {name}")
+            return None
+
+        if os.path.exists(dst):
+            target = storage.get_available_name(target)
+            dst = storage.path(target)
+
+        if dry_run:
+            self.stdout.write(f"{name} -> {target}")
+            return target
+
+        # Journal first: a blob must never be moved without a record of it
+        self.journal_file.write(f"{name}\t{target}\n")
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(src, dst)
+        done.append((src, dst))
+        return target
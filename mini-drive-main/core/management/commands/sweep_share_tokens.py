@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.tasks import sweep_share_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired file and folder share tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        swept = sweep_share_tokens(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {swept} expired share tokens."))
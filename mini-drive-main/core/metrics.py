@@ -0,0 +1,171 @@
+"""
+Prometheus metrics for requests and the file processing pipeline.
+
+Metrics live in prometheus_client's default registry. When
+PROMETHEUS_MULTIPROC_DIR is set, every gunicorn worker writes its samples to
+files in that directory and ``/metrics`` adds up the values of all workers
+(see gunicorn.conf.py, which resets the directory on start-up).
+
+Queries are counted by an execute wrapper installed on every database
+connection. It counts into the ContextVar of the request being served, and
+asgiref copies that context into sync_to_async threads, so queries made by
+async views are counted as well. Inside ``record_queries()`` (used by the
+profiler) each query's SQL and duration are logged too.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUESTS = Counter(
+    "minidrive_requests",
+    "Requests served, by route and status.",
+    ["route", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "minidrive_request_duration_seconds",
+    "Time to build a response, by route.",
+    ["route", "method"],
+)
+REQUEST_QUERIES = Histogram(
+    "minidrive_request_queries",
+    "Database queries per request, by route.",
+    ["route"],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+STAGE_LATENCY = Histogram(
+    "minidrive_postprocess_stage_seconds",
+    "Time each file spends in a processing stage.",
+    ["stage"],
+)
+PROCESSED_FILES = Counter(
+    "minidrive_postprocess_files", "Files processed, by result.", ["result"]
+)
+EMBEDDING_CALLS = Counter(
+    "minidrive_embedding_requests", "Embedding API calls, by caller.", ["source"]
+)
+EMBEDDING_FAILURES = Counter(
+    "minidrive_embedding_failures", "Failed embedding API calls, by caller.", ["source"]
+)
+
+_request_queries = ContextVar("minidrive_request_queries", default=None)
+
+
+class QueryStats:
+    """Queries run for one request; ``log`` is a list while recording."""
+
+    def __init__(self):
+        self.count = 0
+        self.log = None
+
+
+def count_queries(execute, sql, params, many, context):
+    """Execute wrapper counting queries against the current request."""
+    stats = _request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    stats.count += 1
+    if stats.log is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.log.append((sql, time.perf_counter() - start))
+
+
+@contextmanager
+def record_queries():
+    """Collect ``(sql, seconds)`` of every query run inside the block."""
+    stats = _request_queries.get()
+    token = None
+    if stats is None:
+        stats = QueryStats()
+        token = _request_queries.set(stats)
+    log = stats.log = []
+    try:
+        yield log
+    finally:
+        stats.log = None
+        if token is not None:
+            _request_queries.reset(token)
+
+
+class RequestMetrics:
+    """Time one request and count its queries until ``finish`` is called."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = QueryStats()
+        self.token = _request_queries.set(self.queries)
+
+    def finish(self, request, response):
+        elapsed = time.perf_counter() - self.start
+        _request_queries.reset(self.token)
+        match = getattr(request, "resolver_match", None)
+        # URL names, not paths, keep the number of series bounded
+        route = match.view_name if match else "unmatched"
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        REQUEST_LATENCY.labels(route, request.method).observe(elapsed)
+        REQUEST_QUERIES.labels(route).observe(self.queries.count)
+
+
+class StageTimings:
+    """
+    Per-file processing stage durations, CPU times and errors.
+
+    ``with timings("extract"):`` adds the block's wall and thread CPU time to
+    that stage, so a stage entered more than once is still one sample, and
+    notes an exception escaping it. ``observe()`` records every stage in the
+    stage histogram.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.cpu = {}
+        # Stage name -> first exception raised in it
+        self.errors = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        except Exception as e:
+            self.fail(stage, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[stage] = self.durations.get(stage, 0.0) + elapsed
+            cpu = time.thread_time() - cpu_start
+            self.cpu[stage] = self.cpu.get(stage, 0.0) + cpu
+
+    def fail(self, stage, error):
+        """Note ``error`` against ``stage`` unless a stage already has it."""
+        if not any(seen is error for seen in self.errors.values()):
+            self.errors.setdefault(stage, error)
+
+    def observe(self):
+        for stage, seconds in self.durations.items():
+            STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def export():
+    """Return ``(body, content_type)`` of the metrics in text format."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,108 @@
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware as SyncWhiteNoiseMiddleware
+from .metrics import RequestMetrics
+from .profiling import RequestProfiler, wants_profile
+
+
+class WhiteNoiseMiddleware:
+    """
+    WhiteNoise that keeps the ASGI middleware chain asynchronous.
+
+    WhiteNoise's middleware is sync-only. Under ASGI, Django would run it,
+    and every view behind it, in the one thread kept for synchronous code, so
+    a process served one request at a time. Here only requests under
+    STATIC_URL go through WhiteNoise; everything else is passed on directly.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            get_response = async_to_sync(get_response)
+        self.whitenoise = SyncWhiteNoiseMiddleware(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.whitenoise(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.whitenoise.static_prefix):
+            return await sync_to_async(self.whitenoise)(request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record the latency, status and query count of every request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        response = self.get_response(request)
+        metrics.finish(request, response)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        response = await self.get_response(request)
+        metrics.finish(request, response)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile a staff user's request on demand (see profiling.py)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not wants_profile(request) or not request.user.is_staff:
+            return self.get_response(request)
+        with RequestProfiler() as profiler:
+            response = self.get_response(request)
+        profile = profiler.save(request.user, request, response)
+        response["X-Profile-Id"] = str(profile.id)
+        return response
+
+    async def __acall__(self, request):
+        if not wants_profile(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        with RequestProfiler() as profiler:
+            response = await self.get_response(request)
+        profile = await sync_to_async(profiler.save)(user, request, response)
+        response["X-Profile-Id"] = str(profile.id)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_file_options_folder_file_folder_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='encoding',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
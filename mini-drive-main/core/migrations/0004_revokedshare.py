@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_file_stored_size_encoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedShare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=16, unique=True)),
+                ('expiry', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_storage_usage(apps, schema_editor):
+    File = apps.get_model("core", "File")
+    StorageUsage = apps.get_model("core", "StorageUsage")
+    totals = File.objects.order_by().values("owner").annotate(
+        bytes_used=models.Sum("size"), file_count=models.Count("id")
+    )
+    StorageUsage.objects.bulk_create(
+        StorageUsage(
+            user_id=row["owner"],
+            bytes_used=row["bytes_used"],
+            file_count=row["file_count"],
+        )
+        for row in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0004_revokedshare'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bytes_used', models.BigIntegerField(default=0)),
+                ('file_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_storage_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:53
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Folder = apps.get_model("core", "Folder")
+    parents = dict(Folder.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def path_for(folder_id):
+        if folder_id not in paths:
+            parent_id = parents[folder_id]
+            prefix = path_for(parent_id) if parent_id else "/"
+            paths[folder_id] = f"{prefix}{folder_id}/"
+        return paths[folder_id]
+
+    folders = [Folder(id=folder_id, path=path_for(folder_id)) for folder_id in parents]
+    Folder.objects.bulk_update(folders, ["path"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_storageusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
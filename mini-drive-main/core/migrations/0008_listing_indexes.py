@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_purgequeueitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foldersharetoken',
+            name='expiry',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='sharetoken',
+            name='expiry',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', '-uploaded'], name='file_owner_folder_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', '-uploaded'], name='file_owner_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', 'parent', 'name'], name='folder_owner_parent_name'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+def populate_dimensions(apps, schema_editor):
+    Embedding = apps.get_model("core", "Embedding")
+    batch = []
+    for embedding in Embedding.objects.only("id", "vector").iterator(chunk_size=500):
+        vector = embedding.vector
+        embedding.dimension = len(vector) if isinstance(vector, list) else 0
+        batch.append(embedding)
+        if len(batch) >= 500:
+            Embedding.objects.bulk_update(batch, ["dimension"])
+            batch = []
+    Embedding.objects.bulk_update(batch, ["dimension"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_listingversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embedding',
+            name='dimension',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('success', 'Success'), ('partial', 'Partial'), ('failed', 'Failed')], db_index=True, max_length=10)),
+                ('failed_stage', models.CharField(blank=True, choices=[('extract', 'Extract'), ('rasterize', 'Rasterize'), ('resize', 'Resize'), ('embed', 'Embed'), ('save', 'Save')], max_length=20)),
+                ('error_class', models.CharField(blank=True, max_length=200)),
+                ('error_message', models.TextField(blank=True)),
+                ('stages', models.JSONField(default=dict)),
+                ('total_ms', models.FloatField()),
+                ('cpu_ms', models.FloatField()),
+                ('bytes_in', models.BigIntegerField()),
+                ('pages', models.PositiveIntegerField(blank=True, null=True)),
+                ('text_length', models.PositiveIntegerField(default=0)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('processed_at', models.DateTimeField()),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='processing', to='core.file')),
+            ],
+        ),
+    ]
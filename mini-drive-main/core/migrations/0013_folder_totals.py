@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:47
+
+from collections import defaultdict
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_totals(apps, schema_editor):
+    File = apps.get_model("core", "File")
+    Folder = apps.get_model("core", "Folder")
+    paths = dict(Folder.objects.values_list("id", "path"))
+    totals = defaultdict(lambda: [0, 0])
+    direct = (
+        File.objects.filter(folder__isnull=False)
+        .order_by()
+        .values("folder")
+        .annotate(size=Sum("size"), count=Count("id"))
+    )
+    # Every folder's files count towards each folder on its path
+    for row in direct:
+        for ancestor in paths[row["folder"]].strip("/").split("/"):
+            totals[int(ancestor)][0] += row["size"]
+            totals[int(ancestor)][1] += row["count"]
+    Folder.objects.bulk_update(
+        [
+            Folder(id=folder_id, total_size=size, total_files=count)
+            for folder_id, (size, count) in totals.items()
+        ],
+        ["total_size", "total_files"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_processingrecord'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='total_files',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='total_size',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', '-total_size'], name='folder_owner_total_size'),
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_folder_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='file_owner_folder_uploaded',
+        ),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='file_owner_uploaded',
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'uploaded'], name='file_owner_folder_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'name'], name='file_owner_folder_name'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'size'], name='file_owner_folder_size'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'mime_type'], name='file_owner_folder_type'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'uploaded'], name='file_owner_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', 'parent', 'total_size'], name='folder_owner_parent_size'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', 'parent', 'created'], name='folder_owner_parent_created'),
+        ),
+    ]
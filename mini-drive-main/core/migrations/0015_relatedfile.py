@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_listing_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingrecord',
+            name='failed_stage',
+            field=models.CharField(blank=True, choices=[('extract', 'Extract'), ('rasterize', 'Rasterize'), ('resize', 'Resize'), ('embed', 'Embed'), ('save', 'Save'), ('relate', 'Related files')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='RelatedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related', to='core.file')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listed_in', to='core.file')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['file', 'similarity'], name='related_file_similarity'), models.Index(fields=['similarity'], name='related_similarity')],
+                'unique_together': {('file', 'related')},
+            },
+        ),
+    ]
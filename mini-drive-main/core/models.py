@@ -1,11 +1,20 @@
 import uuid
 import os
 from datetime import datetime, timedelta
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
 
+from .sharing import forget_share_tokens
+from .storage import DecompressingReader
+
+
+# Folder fields maintained by totals.py rather than by Folder.save
+TOTAL_FIELDS = ("total_size", "total_files")
+
 
 class Folder(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -14,10 +23,38 @@ class Folder(models.Model):
         "self", null=True, blank=True, on_delete=models.CASCADE, related_name="children"
     )
     created = models.DateTimeField(auto_now_add=True)
+    # Materialised ancestry, e.g. "/3/17/42/" for folder 42 inside 17 inside 3.
+    # Maintained by save(); lets ancestry and subtree queries avoid walking
+    # ``parent`` one query per level.
+    path = models.CharField(max_length=512, db_index=True, default="", editable=False)
+    # Size and file count of the whole subtree. Maintained incrementally by
+    # totals.py; ``repair_folder_totals`` recomputes them. Not constrained to
+    # be positive: a total that has drifted must not make deletes fail.
+    total_size = models.BigIntegerField(default=0, editable=False)
+    total_files = models.IntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ("owner", "name", "parent")
         ordering = ["name"]
+        indexes = [
+            # Folder listings: children of a parent, sorted by name
+            models.Index(
+                fields=["owner", "parent", "name"], name="folder_owner_parent_name"
+            ),
+            # Folder listings sorted by size or date (see listings.py)
+            models.Index(
+                fields=["owner", "parent", "total_size"],
+                name="folder_owner_parent_size",
+            ),
+            models.Index(
+                fields=["owner", "parent", "created"],
+                name="folder_owner_parent_created",
+            ),
+            # A user's largest folders
+            models.Index(
+                fields=["owner", "-total_size"], name="folder_owner_total_size"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -25,22 +62,76 @@ class Folder(models.Model):
     def get_absolute_url(self):
         return reverse("folder_detail", args=[str(self.id)])
 
+    @staticmethod
+    def build_path(parent, folder_id):
+        return f"{parent.path if parent else '/'}{folder_id}/"
+
+    def save(self, *args, **kwargs):
+        from .listings import bump_listing
+        from .totals import move_subtree_totals
+
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # The totals are only ever changed by UPDATEs (see totals.py), so an
+            # instance loaded earlier must not write its stale copy back
+            kwargs["update_fields"] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in TOTAL_FIELDS
+            ]
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            new_path = self.build_path(self.parent, self.id)
+            if self.path == new_path:
+                return
+            if self.parent and self.parent.is_within(self.id):
+                raise ValueError("A folder cannot be moved inside itself.")
+
+            old_path = self.path
+            self.path = new_path
+            Folder.objects.filter(pk=self.pk).update(path=new_path)
+
+            # Moved: re-root the whole subtree in one statement
+            if old_path:
+                Folder.objects.filter(path__startswith=old_path).update(
+                    path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+                )
+                subtree = self.descendants()
+                forget_share_tokens(
+                    ShareToken.objects.filter(file__folder__in=subtree),
+                    FolderShareToken.objects.filter(folder__in=subtree),
+                )
+                move_subtree_totals(self, old_path, new_path)
+                # The new parent's listing is bumped by the post_save signal
+                old_ancestors = old_path.strip("/").split("/")[:-1]
+                bump_listing(
+                    self.owner_id, int(old_ancestors[-1]) if old_ancestors else None
+                )
+
+    def ancestor_ids(self):
+        """Return ids from the root folder down to this one (no query)."""
+        return [int(part) for part in self.path.strip("/").split("/")]
+
+    def descendants(self, include_self=True):
+        """Return every folder in this folder's subtree with one indexed query."""
+        # Range instead of LIKE so SQLite can use the index: every path in
+        # the subtree starts with self.path, and "0" sorts right after "/".
+        subtree = Folder.objects.filter(
+            path__gte=self.path, path__lt=self.path[:-1] + "0"
+        )
+        if not include_self:
+            subtree = subtree.exclude(pk=self.pk)
+        return subtree
+
     def get_breadcrumbs(self):
         """Return list of parent folders for breadcrumb navigation."""
-        breadcrumbs = []
-        current = self
-        while current:
-            breadcrumbs.insert(0, current)
-            current = current.parent
-        return breadcrumbs
+        folders = Folder.objects.in_bulk(self.ancestor_ids())
+        return [folders[folder_id] for folder_id in self.ancestor_ids()]
 
     def get_full_path(self):
         """Return the full path of the folder."""
-        path = [self.name]
-        current = self.parent
-        while current:
-            path.insert(0, current.name)
-            current = current.parent
+        path = [folder.name for folder in self.get_breadcrumbs()]
         return os.path.join(*path) if path else "/"
 
     def create_share_link(self):
@@ -49,19 +140,81 @@ class Folder(models.Model):
             folder=self, expiry=timezone.now() + timedelta(hours=12)
         )
 
-    def delete(self, *args, **kwargs):
-        """Override delete method to delete all files from storage before cascade deletion."""
-        # First, recursively process all subfolders to ensure proper file deletion
-        for subfolder in self.children.all():
-            subfolder.delete()
-
-        # Delete all files in this folder from storage
-        for file in self.files.all():
-            # Explicitly call file.delete() to ensure the overridden method is used
-            file.delete()
+    def is_within(self, folder_id):
+        """Return True if this folder is ``folder_id`` or nested inside it."""
+        return f"/{folder_id}/" in self.path
 
-        # Now proceed with normal deletion (this will remove the folder from db)
-        super().delete(*args, **kwargs)
+    def delete(self, *args, **kwargs):
+        """
+        Delete this folder and its whole subtree with set-based queries.
+
+        Stored blobs are not touched here; their names are queued in
+        PurgeQueueItem and removed later by the ``purge_storage`` task.
+        """
+        from .listings import bump_listing
+        from .quota import adjust_usage
+        from .totals import apply_file_deltas
+
+        with transaction.atomic():
+            bump_listing(self.owner_id, self.parent_id)
+            folders = self.descendants()
+            files = File.objects.filter(folder__in=folders)
+
+            PurgeQueueItem.enqueue(files)
+            share_tokens = ShareToken.objects.filter(file__in=files)
+            folder_share_tokens = FolderShareToken.objects.filter(folder__in=folders)
+            forget_share_tokens(share_tokens, folder_share_tokens)
+            # Without signals: their handlers bump the listings holding the
+            # targets, recreating version rows for folders about to go
+            share_tokens._raw_delete(share_tokens.db)
+            folder_share_tokens._raw_delete(folder_share_tokens.db)
+
+            # Usage counters, one update per owner instead of per file
+            totals = list(
+                files.order_by()
+                .values("owner")
+                .annotate(total=models.Sum("size"), count=models.Count("id"))
+            )
+            for row in totals:
+                adjust_usage(row["owner"], -row["total"], -row["count"])
+            # The subtree's files leave the ancestors' totals as well
+            apply_file_deltas(
+                {
+                    self.parent_id: (
+                        -sum(row["total"] for row in totals),
+                        -sum(row["count"] for row in totals),
+                    )
+                }
+            )
+
+            # Remove dependent rows first, then the files and folders
+            # themselves in one statement each (no per-row signals).
+            delete_dependents(File, files, skip=(File, Folder))
+            file_count = files._raw_delete(files.db)
+            delete_dependents(Folder, folders, skip=(File, Folder))
+            folder_count = folders._raw_delete(folders.db)
+
+        return file_count + folder_count, {
+            File._meta.label: file_count,
+            Folder._meta.label: folder_count,
+        }
+
+
+def delete_dependents(model, queryset, skip=()):
+    """Delete or detach rows that reference ``queryset`` via foreign keys."""
+    for rel in model._meta.get_fields(include_hidden=True):
+        # Reverse foreign keys, including hidden ones (related_name="+")
+        if not rel.auto_created or rel.concrete or rel.many_to_many:
+            continue
+        if rel.related_model in skip:
+            continue
+        dependents = rel.related_model._base_manager.filter(
+            **{f"{rel.field.name}__in": queryset}
+        )
+        if rel.on_delete is models.CASCADE:
+            dependents.delete()
+        elif rel.on_delete is models.SET_NULL:
+            dependents.update(**{rel.field.name: None})
 
 
 class File(models.Model):
@@ -76,17 +229,78 @@ class File(models.Model):
     thumb = models.ImageField(upload_to="thumbs/", null=True, blank=True)
     mime_type = models.CharField(max_length=100, blank=True, null=True)
     processed = models.BooleanField(default=False)
+    # Bytes on disk and the encoding they are stored in ("" means raw).
+    # ``size`` always remains the logical size used for quotas.
+    stored_size = models.BigIntegerField(null=True, blank=True)
+    encoding = models.CharField(max_length=20, blank=True, default="")
 
     class Meta:
         ordering = ["-uploaded"]
         unique_together = ("folder", "name", "owner")
+        indexes = [
+            # Folder listings: files in a folder, newest first. Ascending, so
+            # that scanning it backwards also yields the id tie-break in order.
+            models.Index(
+                fields=["owner", "folder", "uploaded"],
+                name="file_owner_folder_uploaded",
+            ),
+            # Folder listings sorted by name, size or type (see listings.py)
+            models.Index(
+                fields=["owner", "folder", "name"], name="file_owner_folder_name"
+            ),
+            models.Index(
+                fields=["owner", "folder", "size"], name="file_owner_folder_size"
+            ),
+            models.Index(
+                fields=["owner", "folder", "mime_type"], name="file_owner_folder_type"
+            ),
+            # FileListAPI: all of a user's files, newest first (ascending, as
+            # above)
+            models.Index(fields=["owner", "uploaded"], name="file_owner_uploaded"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.owner.username})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Where the file counts towards folder totals, to spot moves on save
+        instance._loaded_placement = (
+            instance.__dict__.get("folder_id"),
+            instance.__dict__.get("size"),
+        )
+        return instance
+
     def get_absolute_url(self):
         return reverse("file_detail", args=[str(self.id)])
 
+    def save(self, *args, **kwargs):
+        self.store_file()
+        # Keep the row and the owner's StorageUsage update (post_save) together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def store_file(self):
+        """Write a pending upload to storage and record how it was stored."""
+        if not self.file or self.file._committed:
+            return
+        name = self.file.name
+        storage = self.file.storage
+        compressed = hasattr(storage, "should_compress") and storage.should_compress(
+            name, self.file.size
+        )
+        self.file.save(name, self.file.file, save=False)
+        self.encoding = "gzip" if compressed else ""
+        self.stored_size = storage.size(self.file.name)
+
+    def open_content(self):
+        """Open the stored file for reading its logical (decompressed) bytes."""
+        stream = self.file.storage.open(self.file.name, "rb")
+        if self.encoding == "gzip":
+            return DecompressingReader(stream)
+        return stream
+
     def create_share_link(self):
         """Create a new share token for this file."""
         return ShareToken.objects.create(
@@ -110,19 +324,155 @@ class File(models.Model):
         super().delete(*args, **kwargs)
 
 
+class PurgeQueueItem(models.Model):
+    """A stored blob whose File row is gone, waiting for the purge sweeper."""
+
+    name = models.CharField(max_length=255)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def enqueue(cls, files):
+        """Queue the stored file and thumbnail names of a File queryset."""
+        names = [
+            name
+            for pair in files.values_list("file", "thumb")
+            for name in pair
+            if name
+        ]
+        cls.objects.bulk_create([cls(name=name) for name in names], batch_size=500)
+
+
+class StorageUsage(models.Model):
+    """Per-user storage totals, kept in step with File rows (see signals.py)."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="storage_usage",
+    )
+    bytes_used = models.BigIntegerField(default=0)
+    file_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Storage usage for user {self.user_id}: {self.bytes_used} bytes"
+
+
+class ListingVersion(models.Model):
+    """
+    Content version of one folder listing (``folder`` is None for the root).
+
+    Bumped whenever a file or subfolder in the listing is created, changed,
+    shared or deleted; cached listing fragments are keyed on it.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    folder = models.ForeignKey(Folder, null=True, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "folder"], name="listing_version_owner_folder"
+            ),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(
+                fields=["owner"],
+                condition=models.Q(folder__isnull=True),
+                name="listing_version_owner_root",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Listing {self.folder_id or 'root'} of user {self.owner_id}: v{self.version}"
+
+
 class Embedding(models.Model):
     file = models.OneToOneField(File, on_delete=models.CASCADE)
     vector = models.JSONField()  # list[float] length 1536
+    # len(vector), stored so listings need not load and decode the vector
+    dimension = models.PositiveIntegerField(default=0, editable=False)
     extracted_text = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return f"Embedding for {self.file.name}"
 
+    def save(self, *args, **kwargs):
+        if "vector" in self.__dict__:
+            self.dimension = len(self.vector) if isinstance(self.vector, list) else 0
+        super().save(*args, **kwargs)
+
+
+class RelatedFile(models.Model):
+    """One of a file's most similar files by embedding (see related.py)."""
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name="related")
+    related = models.ForeignKey(
+        File, on_delete=models.CASCADE, related_name="listed_in"
+    )
+    # Cosine similarity of the two files' embeddings
+    similarity = models.FloatField()
+
+    class Meta:
+        unique_together = ("file", "related")
+        indexes = [
+            # A file's related files, most similar first
+            models.Index(fields=["file", "similarity"], name="related_file_similarity"),
+            # Near-duplicate report: every pair above a threshold
+            models.Index(fields=["similarity"], name="related_similarity"),
+        ]
+
+    def __str__(self):
+        return f"{self.file_id} ~ {self.related_id} ({self.similarity:.3f})"
+
+
+class ProcessingRecord(models.Model):
+    """Outcome and cost of the latest ``postprocess_file`` run for a file."""
+
+    STATUS_CHOICES = [
+        ("success", "Success"),
+        # Processed, but a stage (e.g. the embedding) failed
+        ("partial", "Partial"),
+        ("failed", "Failed"),
+    ]
+    STAGE_CHOICES = [
+        ("extract", "Extract"),
+        ("rasterize", "Rasterize"),
+        ("resize", "Resize"),
+        ("embed", "Embed"),
+        ("save", "Save"),
+        ("relate", "Related files"),
+    ]
+
+    file = models.OneToOneField(
+        File, on_delete=models.CASCADE, related_name="processing"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, db_index=True)
+    failed_stage = models.CharField(max_length=20, choices=STAGE_CHOICES, blank=True)
+    error_class = models.CharField(max_length=200, blank=True)
+    error_message = models.TextField(blank=True)
+    # {stage: {"ms": wall time, "cpu_ms": CPU time, "ok": bool}}
+    stages = models.JSONField(default=dict)
+    total_ms = models.FloatField()
+    cpu_ms = models.FloatField()
+    bytes_in = models.BigIntegerField()
+    pages = models.PositiveIntegerField(null=True, blank=True)
+    text_length = models.PositiveIntegerField(default=0)
+    # Runs before this one, e.g. reprocessing after a failure
+    retries = models.PositiveIntegerField(default=0)
+    processed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Processing of file {self.file_id}: {self.status}"
+
 
 class ShareToken(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     file = models.ForeignKey(File, on_delete=models.CASCADE)
-    expiry = models.DateTimeField()
+    expiry = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return f"Share link for {self.file.name} (expires: {self.expiry})"
@@ -138,7 +488,7 @@ class ShareToken(models.Model):
 class FolderShareToken(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     folder = models.ForeignKey(Folder, on_delete=models.CASCADE)
-    expiry = models.DateTimeField()
+    expiry = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return f"Share link for folder {self.folder.name} (expires: {self.expiry})"
@@ -149,3 +499,40 @@ class FolderShareToken(models.Model):
 
     def get_absolute_url(self):
         return reverse("serve_folder_share", args=[str(self.uuid)])
+
+
+class RevokedShare(models.Model):
+    """A revoked signed share link, kept only until the link would expire."""
+
+    jti = models.CharField(max_length=16, unique=True)
+    expiry = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Revoked share {self.jti} (expires: {self.expiry})"
+
+
+class RequestProfile(models.Model):
+    """A profiled request (see profiling.py), kept for download."""
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_ms = models.FloatField()
+    sample_count = models.PositiveIntegerField()
+    # [{"sql": ..., "ms": ...}] in execution order
+    queries = models.JSONField(default=list)
+    # Collapsed stacks ("frame;frame;frame samples" per line) for flamegraphs
+    stacks = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,142 @@
+"""
+Opt-in profiling of single requests, for staff.
+
+A staff user adds ``?_profile=1`` or an ``X-Profile: 1`` header to a request.
+ProfilingMiddleware then samples the Python stacks of the process every
+PROFILING_INTERVAL seconds while the request is handled, and logs each SQL
+query with its duration. The result is saved as a RequestProfile, whose
+stacks are in the "collapsed" format read by flamegraph.pl, speedscope and
+inferno. Both can be downloaded from the admin.
+
+Every thread is sampled, because an async view's work is split between the
+event loop and sync_to_async threads. Requests served at the same time by
+the same process show up as well, so profile on a quiet worker. Streaming
+responses are profiled until the view returns, not while the body is sent.
+
+Requests without the trigger cost a header lookup and a substring search of
+the query string. With PROFILING=0 the middleware is not loaded at all.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from .metrics import record_queries
+
+PROFILE_PARAM = "_profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+# SQL statements stored per profile; the count and total time cover all
+MAX_LOGGED_QUERIES = 1000
+
+_labels = {}
+_path_prefixes = None
+
+
+def wants_profile(request):
+    """True if the request asks to be profiled (staff is checked separately)."""
+    if request.META.get(PROFILE_HEADER) == "1":
+        return True
+    # Only parse the query string when the parameter may be in it
+    return (
+        PROFILE_PARAM in request.META.get("QUERY_STRING", "")
+        and request.GET.get(PROFILE_PARAM) == "1"
+    )
+
+
+def frame_label(code):
+    """``function (module/path.py:line)`` of a code object, cached."""
+    global _path_prefixes
+    label = _labels.get(code)
+    if label is None:
+        if _path_prefixes is None:
+            # Longest first, so site-packages wins over the prefix above it
+            _path_prefixes = sorted(
+                {str(path) for path in sys.path if path}, key=len, reverse=True
+            )
+        filename = code.co_filename
+        for prefix in _path_prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix) :].lstrip("/\\")
+                break
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+class StackSampler:
+    """Count the stacks of every other thread, sampled from a background one."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """One ``root;...;leaf count`` line per distinct stack."""
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.stacks.most_common()
+        )
+
+
+class RequestProfiler:
+    """Sample stacks and log queries inside ``with``; ``save()`` stores them."""
+
+    def __init__(self, interval=None):
+        self.sampler = StackSampler(interval or settings.PROFILING_INTERVAL)
+
+    def __enter__(self):
+        self._recording = record_queries()
+        self.queries = self._recording.__enter__()
+        self.sampler.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
+        self.sampler.stop()
+        self._recording.__exit__(*exc_info)
+
+    def save(self, user, request, response):
+        from .models import RequestProfile
+
+        match = getattr(request, "resolver_match", None)
+        return RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            view_name=match.view_name if match else "",
+            status_code=response.status_code,
+            duration_ms=self.elapsed * 1000,
+            query_count=len(self.queries),
+            query_ms=sum(seconds for sql, seconds in self.queries) * 1000,
+            sample_count=self.sampler.samples,
+            queries=[
+                {"sql": sql, "ms": round(seconds * 1000, 3)}
+                for sql, seconds in self.queries[:MAX_LOGGED_QUERIES]
+            ],
+            stacks=self.sampler.collapsed(),
+        )
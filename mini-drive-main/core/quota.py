@@ -0,0 +1,146 @@
+from functools import wraps
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Slack for multipart boundaries and form fields counted in Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "This upload would exceed your storage quota."
+    default_code = "quota_exceeded"
+
+
+def quota_bytes():
+    return settings.MAX_STORAGE_MB * 1024 * 1024
+
+
+def compute_usage(user_id):
+    """Aggregate a user's storage totals from the File table."""
+    from .models import File
+
+    totals = File.objects.filter(owner_id=user_id).aggregate(
+        bytes_used=Sum("size"), file_count=Count("id")
+    )
+    return {
+        "bytes_used": totals["bytes_used"] or 0,
+        "file_count": totals["file_count"],
+    }
+
+
+def storage_used(user):
+    """Return the total logical size of the user's files in bytes.
+
+    Reads the materialised StorageUsage row, seeding it from the File table
+    the first time a user is seen.
+    """
+    from .models import StorageUsage
+
+    bytes_used = (
+        StorageUsage.objects.filter(user_id=user.id)
+        .values_list("bytes_used", flat=True)
+        .first()
+    )
+    if bytes_used is None:
+        usage, _ = StorageUsage.objects.get_or_create(
+            user_id=user.id, defaults=compute_usage(user.id)
+        )
+        bytes_used = usage.bytes_used
+    return bytes_used
+
+
+def adjust_usage(user_id, bytes_delta, count_delta):
+    """Apply a delta to a user's StorageUsage row in the current transaction.
+
+    Users without a row yet are skipped; their row is seeded from the File
+    table on first read, which already reflects this change.
+    """
+    from .models import StorageUsage
+
+    StorageUsage.objects.filter(user_id=user_id).update(
+        bytes_used=F("bytes_used") + bytes_delta,
+        file_count=F("file_count") + count_delta,
+    )
+
+
+def exceeds_quota(user, extra_bytes):
+    """Return True if adding ``extra_bytes`` would put the user over quota."""
+    return storage_used(user) + extra_bytes > quota_bytes()
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    Abort a multipart upload that cannot fit in the user's remaining quota.
+
+    The declared Content-Length is checked before any of the body is read.
+    File bytes are then counted as they stream in, so chunked or
+    under-declared bodies are cut off as soon as they cross the limit.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.remaining = None
+        self.received = 0
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            return
+        self.remaining = quota_bytes() - storage_used(user)
+        if content_length > self.remaining + MULTIPART_OVERHEAD:
+            raise self.exceeded()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.remaining is not None:
+            self.received += len(raw_data)
+            if self.received > self.remaining:
+                raise self.exceeded()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def exceeded(self):
+        return QuotaExceeded(
+            "This upload would exceed your storage quota of "
+            f"{settings.MAX_STORAGE_MB} MB."
+        )
+
+
+def upload_quota_guard(view):
+    """
+    Reject over-quota uploads to a function view with a 413.
+
+    The handler has to be installed before CSRF validation reads the body,
+    so the view is exempted from the middleware check and protected here
+    instead, after the handler is in place.
+    """
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method == "POST":
+            request.upload_handlers.insert(0, QuotaUploadHandler(request))
+        try:
+            return protected(request, *args, **kwargs)
+        except QuotaExceeded as e:
+            return HttpResponse(e.detail, status=e.status_code)
+
+    return csrf_exempt(wrapper)
+
+
+class UploadQuotaMixin:
+    """Install QuotaUploadHandler on API views before authentication runs."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        if request.method == "POST":
+            request.upload_handlers.insert(0, QuotaUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
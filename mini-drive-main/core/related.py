@@ -0,0 +1,266 @@
+"""
+Precomputed "related files": each file's most similar files by embedding.
+
+``compute_related`` rebuilds a user's RelatedFile rows in one pass. Their
+unit vectors are copied once into a file-backed array, which is then
+multiplied by its own transpose one block of rows at a time, keeping only
+each row's top k. Memory therefore stays at BLOCK_CELLS similarities plus
+k neighbours per file, however many files the user has.
+
+``add_related`` slots in a file as soon as it is embedded: it gets its own
+top k, and joins the lists of the files it is closer to than their k-th.
+When a file is re-embedded, the lists that held its old similarity are
+recomputed in the same pass over the vectors.
+Files are only compared with files whose embeddings have the same size.
+Listing related files and near-duplicates then only reads RelatedFile.
+"""
+
+import os
+import tempfile
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from .models import Embedding, RelatedFile
+
+# Similarities computed at once (16 MB of float32)
+BLOCK_CELLS = 4 * 1024 * 1024
+# Embeddings decoded from the database at once
+CHUNK_ROWS = 500
+
+
+def unit_rows(vectors):
+    """Return ``vectors`` as float32 rows scaled to unit length."""
+    import numpy as np
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def iter_vectors(user_id, dimension, limit=None):
+    """Yield ``(file_ids, unit_vectors)`` chunks of a user's embeddings."""
+    rows = (
+        Embedding.objects.filter(file__owner_id=user_id, dimension=dimension)
+        .order_by("file_id")
+        .values_list("file_id", "vector")
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    ids, vectors = [], []
+    for file_id, vector in rows.iterator(chunk_size=CHUNK_ROWS):
+        ids.append(file_id)
+        vectors.append(vector)
+        if len(ids) == CHUNK_ROWS:
+            yield ids, unit_rows(vectors)
+            ids, vectors = [], []
+    if ids:
+        yield ids, unit_rows(vectors)
+
+
+def load_matrix(user_id, dimension, directory):
+    """Return ``(file_ids, unit_vectors)``, the vectors in a file in ``directory``."""
+    import numpy as np
+
+    count = Embedding.objects.filter(
+        file__owner_id=user_id, dimension=dimension
+    ).count()
+    ids = np.empty(count, dtype=np.int64)
+    matrix = np.lib.format.open_memmap(
+        os.path.join(directory, f"{user_id}-{dimension}.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(count, dimension),
+    )
+    end = 0
+    for chunk_ids, chunk in iter_vectors(user_id, dimension, limit=count):
+        start, end = end, end + len(chunk_ids)
+        ids[start:end] = chunk_ids
+        matrix[start:end] = chunk
+    # Files deleted since the count leave unused rows at the end
+    return ids[:end], matrix[:end]
+
+
+def top_k(matrix, k):
+    """
+    Return ``(neighbours, similarities)``: each row's ``k`` most similar rows.
+
+    Both are ``(rows, k)`` arrays, best first; a row is not its own neighbour.
+    Only a block of rows is compared with the whole matrix at a time.
+    """
+    import numpy as np
+
+    n = len(matrix)
+    k = min(k, n - 1)
+    neighbours = np.empty((n, max(k, 0)), dtype=np.int64)
+    similarities = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return neighbours, similarities
+    block = max(1, BLOCK_CELLS // n)
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        scores = np.asarray(matrix[start:end]) @ matrix.T
+        rows = np.arange(end - start)
+        scores[rows, rows + start] = -np.inf
+        # The k best of each row, unordered, then ordered
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        neighbours[start:end] = np.take_along_axis(best, order, axis=1)
+        similarities[start:end] = np.take_along_axis(best_scores, order, axis=1)
+    return neighbours, similarities
+
+
+def merge_top_k(best_ids, best_scores, ids, scores, k):
+    """
+    Merge candidates into running per-row top ``k`` lists (unordered).
+
+    ``scores`` has a row per list and a column per candidate in ``ids``.
+    """
+    import numpy as np
+
+    ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ids = np.take_along_axis(ids, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+    return ids, scores
+
+
+def compute_related(user_id, k=None):
+    """Rebuild the RelatedFile rows of a user's files; returns the row count."""
+    k = k or settings.RELATED_FILES
+    dimensions = (
+        Embedding.objects.filter(file__owner_id=user_id, dimension__gt=0)
+        .order_by()
+        .values_list("dimension", flat=True)
+        .distinct()
+    )
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for dimension in dimensions:
+            ids, matrix = load_matrix(user_id, dimension, directory)
+            results.append((ids, *top_k(matrix, k)))
+            del matrix
+
+    # Computed first, so the write lock is only held for the inserts
+    created = 0
+    with transaction.atomic():
+        RelatedFile.objects.filter(file__owner_id=user_id).delete()
+        for ids, neighbours, similarities in results:
+            for start in range(0, len(ids), 1000):
+                created += len(
+                    RelatedFile.objects.bulk_create(
+                        RelatedFile(
+                            file_id=int(ids[row]),
+                            related_id=int(ids[column]),
+                            similarity=float(similarity),
+                        )
+                        for row in range(start, min(start + 1000, len(ids)))
+                        for column, similarity in zip(
+                            neighbours[row], similarities[row]
+                        )
+                    )
+                )
+    return created
+
+
+def add_related(file_id, k=None):
+    """
+    Add a newly embedded (or re-embedded) file to its owner's related files.
+
+    Replaces the file's own list, and adds it to every other file's list that
+    it beats (or that is not full yet), dropping their weakest entry. Lists
+    that held the file's earlier embedding are recomputed outright, since
+    it may have dropped out of them. Lists of files whose embeddings are of
+    a different size are left one short until ``compute_related``.
+    """
+    import numpy as np
+
+    k = k or settings.RELATED_FILES
+    embedding = (
+        Embedding.objects.filter(file_id=file_id)
+        .values_list("file__owner_id", "dimension", "vector")
+        .first()
+    )
+    if embedding is None or not embedding[1]:
+        return
+    owner_id, dimension, vector = embedding
+    # Reprocessed: these lists hold a stale similarity to the file
+    stale = dict(
+        Embedding.objects.filter(
+            file__related__related_id=file_id, dimension=dimension
+        ).values_list("file_id", "vector")
+    )
+    stale_ids = np.array(list(stale), dtype=np.int64)
+    queries = unit_rows([vector, *stale.values()])
+
+    ids, scores = [], []
+    best_ids = np.empty((len(stale_ids), 0), dtype=np.int64)
+    best_scores = np.empty((len(stale_ids), 0), dtype=np.float32)
+    for chunk_ids, chunk in iter_vectors(owner_id, dimension):
+        chunk_scores = chunk @ queries.T
+        ids += chunk_ids
+        scores.append(chunk_scores[:, 0])
+        if len(stale_ids):
+            candidates = chunk_scores[:, 1:].T
+            # A file is not its own neighbour
+            candidates[stale_ids[:, None] == np.array(chunk_ids)] = -np.inf
+            best_ids, best_scores = merge_top_k(
+                best_ids, best_scores, chunk_ids, candidates, k
+            )
+    ids = np.array(ids, dtype=np.int64)
+    scores = np.concatenate(scores)
+    others = ids != file_id
+    ids, scores = ids[others], scores[others]
+
+    with transaction.atomic():
+        RelatedFile.objects.filter(
+            Q(file_id=file_id) | Q(related_id=file_id) | Q(file_id__in=stale)
+        ).delete()
+        lists = {
+            row["file"]: (row["count"], row["weakest"])
+            for row in RelatedFile.objects.filter(file__owner_id=owner_id)
+            .values("file")
+            .annotate(count=Count("id"), weakest=Min("similarity"))
+        }
+
+        best = np.argsort(-scores)[:k]
+        rows = [
+            RelatedFile(
+                file_id=file_id, related_id=int(ids[i]), similarity=float(scores[i])
+            )
+            for i in best
+        ]
+        rows += [
+            RelatedFile(file_id=int(owner), related_id=int(other), similarity=score)
+            for owner, row_ids, row_scores in zip(stale_ids, best_ids, best_scores)
+            for other, score in zip(row_ids.tolist(), row_scores.tolist())
+            if score != -np.inf
+        ]
+        full = []
+        for other, score in zip(ids.tolist(), scores.tolist()):
+            if other in stale:
+                continue
+            count, weakest = lists.get(other, (0, None))
+            if count < k or score > weakest:
+                rows.append(
+                    RelatedFile(file_id=other, related_id=file_id, similarity=score)
+                )
+                if count >= k:
+                    full.append(other)
+        RelatedFile.objects.bulk_create(rows, batch_size=1000)
+
+        # Lists that were full are now one over: drop their weakest
+        if full:
+            extra, seen = [], {}
+            for row_id, other in (
+                RelatedFile.objects.filter(file_id__in=full)
+                .order_by("file_id", "-similarity")
+                .values_list("id", "file_id")
+            ):
+                seen[other] = seen.get(other, 0) + 1
+                if seen[other] > k:
+                    extra.append(row_id)
+            RelatedFile.objects.filter(id__in=extra).delete()
@@ -0,0 +1,77 @@
+"""
+Semantic search over a user's files.
+
+The query is embedded through ``openai.AsyncOpenAI``, so an async view
+waiting on the embedding API does not hold a worker. As with the chat
+client, one client is kept per event loop (see ``clients``): one per worker
+process under ASGI. Stored vectors are then ranked by cosine similarity in one NumPy
+operation, in a worker thread so the event loop keeps serving other requests.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .clients import loop_client
+from .metrics import EMBEDDING_CALLS, EMBEDDING_FAILURES
+from .models import Embedding
+
+def get_client():
+    """Return the shared embeddings client of the running event loop."""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return loop_client(
+        "openai",
+        # An explicit HTTP client: the SDK's own closes itself on the running
+        # loop when garbage collected, which fails once a per-request (WSGI)
+        # loop has gone
+        lambda: AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=DefaultAsyncHttpxClient(),
+        ),
+        lambda client: client.close(),
+    )
+
+
+async def embed_query(text):
+    EMBEDDING_CALLS.labels("search").inc()
+    try:
+        response = await get_client().embeddings.create(
+            input=text, model=settings.EMBED_MODEL
+        )
+    except Exception:
+        EMBEDDING_FAILURES.labels("search").inc()
+        raise
+    return response.data[0].embedding
+
+
+def rank(query_vector, embeddings, limit=20):
+    """Return ``(embedding, similarity)`` pairs, most similar first."""
+    import numpy as np
+
+    if not embeddings:
+        return []
+    vectors = np.array([embedding.vector for embedding in embeddings], dtype=float)
+    query = np.array(query_vector, dtype=float)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+    # Zero vectors are similar to nothing, instead of NaN
+    norms[norms == 0] = 1
+    similarities = vectors @ query / norms
+    ranked = sorted(
+        zip(embeddings, similarities.tolist()), key=lambda pair: pair[1], reverse=True
+    )
+    return ranked[:limit]
+
+
+async def search_files(user_id, query, limit=20, related=("file",)):
+    """Rank the embedded files of ``user_id`` against ``query``."""
+    query_vector = await embed_query(query)
+    embeddings = [
+        embedding
+        async for embedding in Embedding.objects.filter(file__owner_id=user_id)
+        .select_related(*related)
+        .defer("extracted_text")
+    ]
+    # Pure NumPy work, so it need not wait for the thread serving the ORM
+    return await sync_to_async(rank, thread_sensitive=False)(
+        query_vector, embeddings, limit
+    )
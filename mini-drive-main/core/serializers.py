@@ -1,5 +1,15 @@
+import posixpath
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
-from .models import File, ShareToken
+from .listings import bump_listings
+from .models import File, Folder, ShareToken
+from .quota import adjust_usage, exceeds_quota
+from .totals import apply_file_deltas
 
 
 class FileSerializer(serializers.ModelSerializer):
@@ -20,6 +30,13 @@ class FileSerializer(serializers.ModelSerializer):
             "processed",
         ]
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse responses: keep only the requested fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def get_thumb_url(self, obj):
         if obj.thumb:
             return obj.thumb.url
@@ -35,6 +52,73 @@ class FileSerializer(serializers.ModelSerializer):
         return obj.owner.username
 
 
+class FileListSerializer:
+    """
+    Read-only, high-throughput equivalent of FileSerializer for listings.
+
+    Works on ``.values()`` rows instead of model instances, so no File or
+    User objects are built. The download and media URL prefixes are computed
+    once per request rather than per row. Output matches FileSerializer.
+    """
+
+    # Output field -> column it is computed from
+    columns = {
+        "id": "id",
+        "name": "name",
+        "size": "size",
+        "uploaded": "uploaded",
+        "thumb_url": "thumb",
+        "download_url": "id",
+        "owner_username": "owner__username",
+        "processed": "processed",
+    }
+
+    def __init__(self, request=None, fields=None):
+        self.fields = list(fields or FileSerializer.Meta.fields)
+        download_prefix = "/download/"
+        if request is not None:
+            download_prefix = request.build_absolute_uri(download_prefix)
+        self.download_prefix = download_prefix
+
+        storage = File._meta.get_field("thumb").storage
+        if isinstance(storage, FileSystemStorage):
+            base_url = storage.base_url
+            self.thumb_url = lambda name: base_url + filepath_to_uri(name)
+        else:
+            self.thumb_url = storage.url
+
+    def rows(self, queryset):
+        """Return ``queryset`` as ``.values()`` rows with just the needed columns.
+
+        ``id`` and ``uploaded`` are always fetched for cursor pagination.
+        """
+        columns = {"id", "uploaded"} | {self.columns[name] for name in self.fields}
+        return queryset.values(*columns)
+
+    def to_representation(self, rows):
+        fields = self.fields
+        download_prefix = self.download_prefix
+        thumb_url = self.thumb_url
+        tz = timezone.get_current_timezone()
+        data = []
+        for row in rows:
+            item = {}
+            for name in fields:
+                if name == "uploaded":
+                    value = row["uploaded"].astimezone(tz).isoformat()
+                    if value.endswith("+00:00"):
+                        value = value[:-6] + "Z"
+                elif name == "thumb_url":
+                    value = thumb_url(row["thumb"]) if row["thumb"] else None
+                elif name == "download_url":
+                    value = f"{download_prefix}{row['id']}/"
+                else:
+                    value = row[self.columns[name]]
+                item[name] = value
+            data.append(item)
+        return data
+
+
 class ShareTokenSerializer(serializers.ModelSerializer):
     file_name = serializers.SerializerMethodField()
     share_url = serializers.SerializerMethodField()
@@ -58,6 +142,15 @@ class FileUploadSerializer(serializers.ModelSerializer):
         model = File
         fields = ["file"]
 
+    def validate_file(self, value):
+        request = self.context.get("request")
+        if exceeds_quota(request.user, value.size):
+            raise serializers.ValidationError(
+                "This file would exceed your storage quota of "
+                f"{settings.MAX_STORAGE_MB} MB."
+            )
+        return value
+
     def create(self, validated_data):
         request = self.context.get("request")
         file = validated_data.get("file")
@@ -66,3 +159,168 @@ class FileUploadSerializer(serializers.ModelSerializer):
         instance.save()
 
         return instance
+
+
+class BulkFileUploadSerializer(serializers.Serializer):
+    """Validate and store a batch of uploads in one pass.
+
+    ``paths`` is an optional list parallel to ``files`` holding each file's
+    path relative to the target folder (e.g. ``"photos/2024/a.png"``).
+    Missing intermediate folders are created.
+    """
+
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    paths = serializers.ListField(
+        child=serializers.CharField(allow_blank=True), required=False
+    )
+    folder = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_folder(self, value):
+        if value is None:
+            return None
+        request = self.context.get("request")
+        try:
+            return Folder.objects.get(id=value, owner=request.user)
+        except Folder.DoesNotExist:
+            raise serializers.ValidationError("Folder not found.")
+
+    def validate(self, attrs):
+        request = self.context.get("request")
+        files = attrs["files"]
+        paths = attrs.get("paths") or [f.name for f in files]
+
+        if len(paths) != len(files):
+            raise serializers.ValidationError(
+                {"paths": "Must contain exactly one entry per uploaded file."}
+            )
+
+        # Normalise relative paths into (folder parts, file name)
+        entries = []
+        for upload, path in zip(files, paths):
+            path = path or upload.name
+            parts = posixpath.normpath(path).split("/")
+            if path.startswith("/") or any(p in ("", ".", "..") for p in parts):
+                raise serializers.ValidationError(
+                    {"paths": f"Invalid relative path '{path}'."}
+                )
+            entries.append((tuple(parts[:-1]), parts[-1], upload))
+
+        # Check the whole batch against the quota at once
+        batch_size = sum(upload.size for _, _, upload in entries)
+        if exceeds_quota(request.user, batch_size):
+            raise serializers.ValidationError(
+                "These files would exceed your storage quota of "
+                f"{settings.MAX_STORAGE_MB} MB."
+            )
+
+        attrs["entries"] = entries
+        return attrs
+
+    def _resolve_folders(self, owner, root, dir_paths):
+        """Map every relative directory path to a Folder, creating missing ones.
+
+        Runs one lookup and at most one bulk insert per tree depth rather than
+        one query per folder.
+        """
+        resolved = {(): root}
+        depth = 1
+        while True:
+            wanted = {p[:depth] for p in dir_paths if len(p) >= depth}
+            if not wanted:
+                return resolved
+
+            parents = {resolved[p[:-1]] for p in wanted}
+            parent_ids = [p.id for p in parents if p is not None]
+            lookup = Q(parent_id__in=parent_ids)
+            if None in parents:
+                lookup |= Q(parent__isnull=True)
+            existing = {
+                (f.parent_id, f.name): f
+                for f in Folder.objects.filter(
+                    lookup, owner=owner, name__in={p[-1] for p in wanted}
+                )
+            }
+
+            missing = {}
+            for path in wanted:
+                parent = resolved[path[:-1]]
+                key = (parent.id if parent else None, path[-1])
+                if key in existing:
+                    resolved[path] = existing[key]
+                else:
+                    missing[path] = Folder(owner=owner, name=path[-1], parent=parent)
+            if missing:
+                # bulk_create skips Folder.save(), so fill in paths afterwards
+                created = Folder.objects.bulk_create(missing.values())
+                for folder in created:
+                    folder.path = Folder.build_path(folder.parent, folder.id)
+                Folder.objects.bulk_update(created, ["path"])
+                resolved.update(missing)
+            depth += 1
+
+    def create(self, validated_data):
+        request = self.context.get("request")
+        owner = request.user
+        entries = validated_data["entries"]
+
+        with transaction.atomic():
+            folders = self._resolve_folders(
+                owner, validated_data.get("folder"), {d for d, _, _ in entries}
+            )
+
+            # One query for name collisions across every target folder
+            targets = {folders[d] for d, _, _ in entries}
+            target_ids = [f.id for f in targets if f is not None]
+            lookup = Q(folder_id__in=target_ids)
+            if None in targets:
+                lookup |= Q(folder__isnull=True)
+            taken = set(
+                File.objects.filter(
+                    lookup, owner=owner, name__in={n for _, n, _ in entries}
+                ).values_list("folder_id", "name")
+            )
+
+            instances = []
+            skipped = []
+            for dir_path, name, upload in entries:
+                folder = folders[dir_path]
+                key = (folder.id if folder else None, name)
+                if key in taken:
+                    skipped.append(
+                        {
+                            "path": "/".join(dir_path + (name,)),
+                            "error": f"A file named '{name}' already exists in this location.",
+                        }
+                    )
+                    continue
+                taken.add(key)
+                instances.append(
+                    File(
+                        owner=owner,
+                        folder=folder,
+                        name=name,
+                        file=upload,
+                        size=upload.size,
+                    )
+                )
+
+            for instance in instances:
+                instance.store_file()
+            File.objects.bulk_create(instances)
+
+            # bulk_create sends no post_save, so update usage for the batch
+            adjust_usage(owner.id, sum(f.size for f in instances), len(instances))
+            # ...and the folder totals, one UPDATE per distinct ancestor delta
+            deltas = {}
+            for f in instances:
+                size, count = deltas.get(f.folder_id, (0, 0))
+                deltas[f.folder_id] = (size + f.size, count + 1)
+            apply_file_deltas(deltas)
+            # ...and invalidate the listings that changed (including the
+            # parents of any folders created for the batch)
+            bump_listings(
+                [(owner.id, f.folder_id) for f in instances]
+                + [(owner.id, f.parent_id) for f in folders.values() if f is not None]
+            )
+
+        return {"files": instances, "skipped": skipped}
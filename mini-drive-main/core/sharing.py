@@ -0,0 +1,140 @@
+"""
+Stateless share links.
+
+A signed share URL carries the target id, its scope ("file" or "folder") and
+an expiry, signed with an HMAC over SECRET_KEY via ``django.core.signing``.
+Serving one needs no token lookup. Revoked links are tracked by their short
+random id in ``RevokedShare``; that table only holds unexpired entries and is
+cached per process.
+
+Database share tokens (``ShareToken``/``FolderShareToken``) are resolved
+through a short-lived cache of their target, owner, folder path and expiry,
+so serving a link does not look the token up on every hit.
+"""
+
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+SHARE_SALT = "core.sharing"
+SHARE_LIFETIME = timedelta(hours=12)
+
+REVOKED_CACHE_KEY = "core:revoked_shares"
+# Other workers pick up a revocation within this many seconds
+REVOKED_CACHE_SECONDS = 60
+
+# Resolved share tokens are cached until they expire, but for at most this
+# long, so other workers notice deleted or edited tokens within the minute
+TOKEN_CACHE_SECONDS = 60
+
+
+class ShareRevoked(signing.BadSignature):
+    """The share link has a valid signature but was revoked."""
+
+
+def sign_share(scope, object_id, lifetime=SHARE_LIFETIME):
+    """Return ``(token, expiry)`` for a new signed share of a file or folder."""
+    expiry = timezone.now() + lifetime
+    payload = {
+        "s": scope,
+        "id": object_id,
+        "exp": int(expiry.timestamp()),
+        "j": secrets.token_urlsafe(6),
+    }
+    return signing.dumps(payload, salt=SHARE_SALT, compress=True), expiry
+
+
+def load_share(token, scope=None, check_revoked=True):
+    """
+    Verify a signed share token and return its payload.
+
+    Raises ``signing.BadSignature`` (or a subclass) if the token was tampered
+    with, has the wrong scope, has expired or was revoked.
+    """
+    payload = signing.loads(token, salt=SHARE_SALT)
+    if scope is not None and payload.get("s") != scope:
+        raise signing.BadSignature("Share scope mismatch.")
+    if payload["exp"] <= timezone.now().timestamp():
+        raise signing.SignatureExpired("Share link has expired.")
+    if check_revoked and payload["j"] in revoked_share_ids():
+        raise ShareRevoked("Share link has been revoked.")
+    return payload
+
+
+def share_expiry(payload):
+    return datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc)
+
+
+def revoked_share_ids():
+    """Return the set of revoked, not yet expired share ids (cached)."""
+    from .models import RevokedShare
+
+    def fetch():
+        return set(
+            RevokedShare.objects.filter(expiry__gt=timezone.now()).values_list(
+                "jti", flat=True
+            )
+        )
+
+    return cache.get_or_set(REVOKED_CACHE_KEY, fetch, REVOKED_CACHE_SECONDS)
+
+
+def revoke_share(payload):
+    """Revoke a verified share payload and prune expired revocations."""
+    from .models import RevokedShare
+
+    RevokedShare.objects.filter(expiry__lte=timezone.now()).delete()
+    RevokedShare.objects.get_or_create(
+        jti=payload["j"], defaults={"expiry": share_expiry(payload)}
+    )
+    cache.delete(REVOKED_CACHE_KEY)
+
+
+def token_cache_key(model, uuid):
+    return f"core:share:{model._meta.model_name}:{uuid}"
+
+
+def resolve_share_token(model, uuid):
+    """
+    Return the cached target of an unexpired ShareToken or FolderShareToken.
+
+    The result is a dict with ``target_id`` (the file or folder id),
+    ``owner_id``, ``path`` (the folder path, or the file's folder path) and
+    ``expiry``, or None if the token does not exist or has expired.
+    """
+    from .models import FolderShareToken
+
+    key = token_cache_key(model, uuid)
+    entry = cache.get(key)
+    if entry is None:
+        target = "folder" if model is FolderShareToken else "file"
+        folder_path = "folder__path" if target == "folder" else "file__folder__path"
+        row = (
+            model.objects.filter(uuid=uuid)
+            .values_list(f"{target}_id", f"{target}__owner_id", folder_path, "expiry")
+            .first()
+        )
+        if row is None:
+            return None
+        entry = dict(zip(("target_id", "owner_id", "path", "expiry"), row))
+        ttl = (entry["expiry"] - timezone.now()).total_seconds()
+        if ttl > 0:
+            cache.set(key, entry, min(ttl, TOKEN_CACHE_SECONDS))
+
+    if entry["expiry"] <= timezone.now():
+        return None
+    return entry
+
+
+def forget_share_tokens(*querysets):
+    """Drop the cached entries of the given token querysets once committed."""
+    keys = [
+        token_cache_key(queryset.model, uuid)
+        for queryset in querysets
+        for uuid in queryset.values_list("uuid", flat=True)
+    ]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
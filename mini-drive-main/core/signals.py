@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .db import apply_sqlite_pragmas
+from .listings import bump_listing
+from .metrics import count_queries
+from .models import File, Folder, FolderShareToken, ShareToken
+from .quota import adjust_usage
+from .sharing import token_cache_key
+from .totals import apply_file_deltas
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor == "sqlite" and settings.SQLITE_CONCURRENCY:
+        apply_sqlite_pragmas(connection)
+
+
+@receiver(connection_created)
+def track_queries(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def deleting_owner(origin):
+    """True if a post_delete is part of deleting a user (or users)."""
+    if isinstance(origin, QuerySet):
+        return origin.model is get_user_model()
+    return isinstance(origin, get_user_model())
+
+
+@receiver(post_save, sender=File)
+def file_created(sender, instance, created, **kwargs):
+    placement = (instance.folder_id, instance.size)
+    if created:
+        adjust_usage(instance.owner_id, instance.size, 1)
+        apply_file_deltas({instance.folder_id: (instance.size, 1)})
+    else:
+        old_folder_id, old_size = getattr(instance, "_loaded_placement", placement)
+        if old_size is None:
+            old_size = instance.size
+        if (old_folder_id, old_size) != placement:
+            # Moved (or resized): take it out of the old chain, add to the new
+            deltas = {old_folder_id: (-old_size, -1)}
+            size, count = deltas.get(instance.folder_id, (0, 0))
+            deltas[instance.folder_id] = (size + instance.size, count + 1)
+            apply_file_deltas(deltas)
+            bump_listing(instance.owner_id, old_folder_id)
+    instance._loaded_placement = placement
+    # Covers processing completing too
+    bump_listing(instance.owner_id, instance.folder_id)
+
+
+@receiver(post_delete, sender=File)
+def file_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the owner takes the usage row, totals and listings along;
+    # bumping a listing would recreate a row for a folder about to go
+    if deleting_owner(origin):
+        return
+    adjust_usage(instance.owner_id, -instance.size, -1)
+    apply_file_deltas({instance.folder_id: (-instance.size, -1)})
+    bump_listing(instance.owner_id, instance.folder_id)
+
+
+@receiver(post_save, sender=Folder)
+def folder_saved(sender, instance, **kwargs):
+    bump_listing(instance.owner_id, instance.parent_id)
+
+
+@receiver(post_save, sender=ShareToken)
+@receiver(post_delete, sender=ShareToken)
+@receiver(post_save, sender=FolderShareToken)
+@receiver(post_delete, sender=FolderShareToken)
+def share_token_changed(sender, instance, origin=None, **kwargs):
+    # Deleting a file or folder cascades here too
+    key = token_cache_key(sender, instance.uuid)
+    transaction.on_commit(lambda: cache.delete(key))
+    if deleting_owner(origin):
+        return
+
+    # Listings show share links, so the one holding the target changes
+    if sender is ShareToken:
+        target = File.objects.filter(id=instance.file_id).values_list(
+            "owner_id", "folder_id"
+        )
+    else:
+        target = Folder.objects.filter(id=instance.folder_id).values_list(
+            "owner_id", "parent_id"
+        )
+    for owner_id, folder_id in target:
+        bump_listing(owner_id, folder_id)
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import mimetypes
+import posixpath
+import re
+import tempfile
+import uuid
+from django.core.files.base import File as DjangoFile
+from django.core.files.storage import FileSystemStorage
+
+# MIME types worth compressing besides text/*
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/x-yaml",
+    "image/svg+xml",
+}
+
+# Extensions that mimetypes may not know about but are plain text
+COMPRESSIBLE_EXTENSIONS = (".log", ".ndjson", ".jsonl", ".yaml", ".yml", ".md")
+
+
+# Matches names already laid out as "<dir>/<xx>/<yy>/<basename>"
+SHARDED_NAME_RE = re.compile(r"^(?:.+/)?[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$")
+
+
+def shard_name(name, key=None):
+    """
+    Insert two hash-derived directory levels before the basename.
+
+    ``files/report.pdf`` becomes ``files/3f/a2/report.pdf``. The prefix is
+    hashed from ``key`` (``shard_media`` passes the row id) or, for new
+    uploads, from a random token, so that files sharing a common name such as
+    ``report.pdf`` spread over every directory instead of colliding in one.
+    """
+    dirname, basename = posixpath.split(name)
+    if key is None:
+        key = uuid.uuid4().hex
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+    return posixpath.join(dirname, digest[:2], digest[2:4], basename)
+
+
+def is_sharded(name):
+    return bool(SHARDED_NAME_RE.match(name))
+
+
+def is_compressible(name):
+    """Return True if a file with this name is a text-like, uncompressed type."""
+    mime_type, encoding = mimetypes.guess_type(name)
+    if encoding is not None:
+        return False
+    if mime_type:
+        return mime_type.startswith("text/") or mime_type in COMPRESSIBLE_TYPES
+    return name.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+class MediaStorage(FileSystemStorage):
+    """
+    Local media storage with optional sharding and gzip compression at rest.
+
+    When ``shard`` is enabled, new files are fanned out into hash-prefixed
+    subdirectories (see ``shard_name``) instead of one flat directory.
+
+    When ``compress`` is enabled, text-like uploads are gzipped on write and
+    stored under their name plus a ``.gz`` suffix. ``File.store_file``
+    records the encoding on the model so reads know whether to decompress.
+    """
+
+    def __init__(
+        self,
+        shard=False,
+        compress=False,
+        compress_level=6,
+        compress_min_size=1024,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.shard = shard
+        self.compress = compress
+        self.compress_level = compress_level
+        self.compress_min_size = compress_min_size
+
+    def generate_filename(self, filename):
+        filename = super().generate_filename(filename)
+        if self.shard and not is_sharded(filename):
+            filename = shard_name(filename)
+        return filename
+
+    def should_compress(self, name, size=None):
+        if not self.compress:
+            return False
+        if size is not None and size < self.compress_min_size:
+            return False
+        return is_compressible(name)
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = DjangoFile(content, name)
+        if self.should_compress(name, content.size):
+            name = f"{name}.gz"
+            content = self._compress(content)
+        return super().save(name, content, max_length=max_length)
+
+    def _compress(self, content):
+        """Gzip ``content`` chunk by chunk into a spooled temporary file."""
+        spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        with gzip.GzipFile(
+            fileobj=spool, mode="wb", compresslevel=self.compress_level, mtime=0
+        ) as gz:
+            for chunk in content.chunks():
+                gz.write(chunk)
+        spool.seek(0)
+        return DjangoFile(spool)
+
+
+class DecompressingReader:
+    """
+    Read-only stream that gunzips a stored file on the fly.
+
+    It intentionally has no ``seek``/``tell`` so that FileResponse streams it
+    without first decompressing everything to measure its length.
+    """
+
+    def __init__(self, fileobj):
+        self._raw = fileobj
+        self._gzip = gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+    def read(self, size=-1):
+        return self._gzip.read(size)
+
+    def close(self):
+        self._gzip.close()
+        self._raw.close()
@@ -1,25 +1,47 @@
-import os
+import gzip
 import mimetypes
 import io
+import time
 from pathlib import Path
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from celery import shared_task
-from PIL import Image
-import fitz  # PyMuPDF
-import numpy as np
-from openai import OpenAI
+from .db import UpdateBuffer
+from .listings import bump_listings
+from .metrics import (
+    EMBEDDING_CALLS,
+    EMBEDDING_FAILURES,
+    PROCESSED_FILES,
+    StageTimings,
+)
 
 
 @shared_task
-def postprocess_file(file_id):
+def postprocess_file(file_id, updates=None):
     """
     Process uploaded file:
     - Generate thumbnail for PDFs
     - Extract text from PDFs/text files
     - Generate OpenAI embedding for the text
+
+    The outcome, with per-stage timings, is kept in the file's
+    ProcessingRecord.
+
+    When called in-process with an ``UpdateBuffer`` as ``updates``, the
+    file's status columns are queued there instead of saved immediately.
     """
     from .models import File, Embedding
+    from .related import add_related
 
+    timings = StageTimings()
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    file_obj = None
+    error = None
+    pages = None
+    # Variable to store extracted text
+    extracted_text = ""
     try:
         file_obj = File.objects.get(id=file_id)
 
@@ -28,52 +50,61 @@ def postprocess_file(file_id):
         mime_type = mimetypes.guess_type(file_path)[0]
         file_obj.mime_type = mime_type
 
-        # Variable to store extracted text
-        extracted_text = ""
-
         # Handle PDF files (thumbnail + text extraction)
         if mime_type == "application/pdf":
             try:
+                # Imported here so web workers that never process PDFs
+                # don't pay for PyMuPDF and Pillow
+                import fitz  # PyMuPDF
+                from PIL import Image
+
                 # Open PDF with PyMuPDF
-                pdf_document = fitz.open(file_path)
+                with timings("extract"):
+                    pdf_document = fitz.open(file_path)
+                pages = pdf_document.page_count
 
                 if pdf_document.page_count > 0:
                     # Get first page
                     first_page = pdf_document[0]
 
                     # Extract text (up to 8000 chars)
-                    extracted_text = ""
-                    for page in pdf_document:
-                        extracted_text += page.get_text()
-                        if len(extracted_text) >= 8000:
-                            break
-                    extracted_text = extracted_text[:8000]
+                    with timings("extract"):
+                        extracted_text = ""
+                        for page in pdf_document:
+                            extracted_text += page.get_text()
+                            if len(extracted_text) >= 8000:
+                                break
+                        extracted_text = extracted_text[:8000]
 
                     # Create thumbnail (render to PNG)
-                    pix = first_page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img_data = pix.tobytes("png")
+                    with timings("rasterize"):
+                        pix = first_page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                        img_data = pix.tobytes("png")
 
                     # Resize image to 360px width
-                    img = Image.open(io.BytesIO(img_data))
-                    width, height = img.size
-                    new_width = 360
-                    new_height = int(height * (new_width / width))
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
+                    with timings("resize"):
+                        img = Image.open(io.BytesIO(img_data))
+                        width, height = img.size
+                        new_width = 360
+                        new_height = int(height * (new_width / width))
+                        img = img.resize((new_width, new_height), Image.LANCZOS)
+                        thumb_io = io.BytesIO()
+                        img.save(thumb_io, format="PNG")
 
                     # Save thumbnail
+                    # The thumb field's upload_to already adds "thumbs/"
                     thumb_name = f"{Path(file_obj.name).stem}_thumb.png"
-                    thumb_path = os.path.join("thumbs", thumb_name)
-                    thumb_io = io.BytesIO()
-                    img.save(thumb_io, format="PNG")
 
                     from django.core.files.base import ContentFile
 
-                    file_obj.thumb.save(
-                        thumb_path, ContentFile(thumb_io.getvalue()), save=False
-                    )
+                    with timings("save"):
+                        file_obj.thumb.save(
+                            thumb_name, ContentFile(thumb_io.getvalue()), save=False
+                        )
 
                 pdf_document.close()
             except Exception as e:
+                timings.fail("extract", e)
                 print(f"Error processing PDF: {e}")
 
         # Handle text files
@@ -81,33 +112,220 @@ def postprocess_file(file_id):
             mime_type.startswith("text/") or mime_type == "application/json"
         ):
             try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    extracted_text = f.read(8000)
+                with timings("extract"):
+                    if file_obj.encoding == "gzip":
+                        f = gzip.open(
+                            file_path, "rt", encoding="utf-8", errors="ignore"
+                        )
+                    else:
+                        f = open(file_path, "r", encoding="utf-8", errors="ignore")
+                    with f:
+                        extracted_text = f.read(8000)
             except Exception as e:
                 print(f"Error extracting text: {e}")
 
         # Generate embedding if we have text
         if extracted_text:
             try:
-                client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                response = client.embeddings.create(
-                    input=extracted_text, model=settings.EMBED_MODEL
-                )
-                vector = response.data[0].embedding
+                from openai import OpenAI
 
-                # Save embedding
-                Embedding.objects.create(
-                    file=file_obj, vector=vector, extracted_text=extracted_text
-                )
+                EMBEDDING_CALLS.labels("processing").inc()
+                with timings("embed"):
+                    client = OpenAI(
+                        api_key=settings.OPENAI_API_KEY,
+                        base_url=settings.OPENAI_BASE_URL,
+                    )
+                    response = client.embeddings.create(
+                        input=extracted_text, model=settings.EMBED_MODEL
+                    )
+                    vector = response.data[0].embedding
             except Exception as e:
+                EMBEDDING_FAILURES.labels("processing").inc()
                 print(f"Error generating embedding: {e}")
+            else:
+                # Save embedding (replacing one from an earlier run)
+                try:
+                    with timings("save"):
+                        Embedding.objects.update_or_create(
+                            file=file_obj,
+                            defaults={
+                                "vector": vector,
+                                "extracted_text": extracted_text,
+                            },
+                        )
+                except Exception as e:
+                    print(f"Error saving embedding: {e}")
+                else:
+                    try:
+                        with timings("relate"):
+                            add_related(file_obj.id)
+                    except Exception as e:
+                        print(f"Error updating related files: {e}")
 
         # Mark as processed
         file_obj.processed = True
-        file_obj.save()
+        with timings("save"):
+            if updates is not None:
+                updates.add(
+                    file_obj.id,
+                    mime_type=file_obj.mime_type,
+                    thumb=file_obj.thumb.name or None,
+                    processed=True,
+                )
+            else:
+                file_obj.save()
 
         return {"status": "success", "file_id": file_id}
 
     except Exception as e:
+        error = e
         print(f"Error in postprocess_file task: {e}")
         return {"status": "error", "message": str(e)}
+    finally:
+        timings.observe()
+        status = "failed" if error else "partial" if timings.errors else "success"
+        PROCESSED_FILES.labels(status).inc()
+        if file_obj is not None:
+            try:
+                record_processing(
+                    file_obj,
+                    timings,
+                    status,
+                    error,
+                    elapsed=time.perf_counter() - started,
+                    cpu=time.thread_time() - cpu_started,
+                    pages=pages,
+                    text_length=len(extracted_text),
+                )
+            except Exception as e:
+                print(f"Error recording processing of file {file_id}: {e}")
+
+
+def record_processing(file_obj, timings, status, error, elapsed, cpu, **counts):
+    """Save the outcome of a postprocess_file run as the file's record."""
+    from .models import ProcessingRecord
+
+    if error is None and timings.errors:
+        error = next(iter(timings.errors.values()))
+    failed_stage = next(
+        (stage for stage, seen in timings.errors.items() if seen is error), ""
+    )
+    fields = {
+        "status": status,
+        "failed_stage": failed_stage,
+        "error_class": type(error).__name__ if error else "",
+        "error_message": str(error)[:1000] if error else "",
+        "stages": {
+            stage: {
+                "ms": round(seconds * 1000, 3),
+                "cpu_ms": round(timings.cpu[stage] * 1000, 3),
+                "ok": stage not in timings.errors,
+            }
+            for stage, seconds in timings.durations.items()
+        },
+        "total_ms": elapsed * 1000,
+        "cpu_ms": cpu * 1000,
+        "bytes_in": file_obj.size,
+        "processed_at": timezone.now(),
+        **counts,
+    }
+    records = ProcessingRecord.objects.filter(file_id=file_obj.id)
+    if not records.update(retries=F("retries") + 1, **fields):
+        ProcessingRecord.objects.create(file_id=file_obj.id, **fields)
+
+
+@shared_task
+def postprocess_files(file_ids):
+    """
+    Process a batch of uploaded files in a single task.
+
+    Status updates are coalesced and written in batched transactions rather
+    than one write per file, which keeps SQLite lock hold time down.
+    """
+    from .models import File
+
+    with UpdateBuffer(File) as updates:
+        results = [postprocess_file(file_id, updates=updates) for file_id in file_ids]
+    # Buffered updates send no post_save, so invalidate the listings here
+    bump_listings(
+        File.objects.filter(id__in=file_ids).values_list("owner_id", "folder_id")
+    )
+    return results
+
+
+@shared_task
+def compute_related_files(user_id=None):
+    """
+    Rebuild the related files of one user, or of every user with embeddings.
+
+    Returns the number of RelatedFile rows written.
+    """
+    from .models import File
+    from .related import compute_related
+
+    if user_id is not None:
+        return compute_related(user_id)
+    owners = (
+        File.objects.filter(embedding__isnull=False)
+        .order_by()
+        .values_list("owner_id", flat=True)
+        .distinct()
+    )
+    return sum(compute_related(owner_id) for owner_id in owners)
+
+
+@shared_task
+def sweep_share_tokens(batch_size=1000):
+    """
+    Bulk-delete expired ShareToken and FolderShareToken rows, in batches.
+
+    Returns the number of tokens removed.
+    """
+    from .models import FolderShareToken, ShareToken
+
+    now = timezone.now()
+    swept = 0
+    for model in (ShareToken, FolderShareToken):
+        expired = model.objects.filter(expiry__lte=now)
+        while True:
+            ids = list(expired.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # Expired entries have already aged out of the token cache, so
+            # skip per-row delete signals
+            swept += model.objects.filter(id__in=ids)._raw_delete(expired.db)
+    return swept
+
+
+@shared_task
+def purge_storage(batch_size=500):
+    """
+    Delete queued blobs left behind by folder deletion, in batches.
+
+    Returns the number of blobs removed.
+    """
+    from .models import File, PurgeQueueItem
+
+    storage = File._meta.get_field("file").storage
+    purged = 0
+    last_id = 0
+
+    while True:
+        batch = list(
+            PurgeQueueItem.objects.filter(id__gt=last_id).order_by("id")[:batch_size]
+        )
+        if not batch:
+            return purged
+        last_id = batch[-1].id
+
+        # Failed deletions stay queued for the next sweep
+        done = []
+        for item in batch:
+            try:
+                storage.delete(item.name)
+            except Exception as e:
+                print(f"Error purging {item.name}: {e}")
+                continue
+            done.append(item.id)
+        PurgeQueueItem.objects.filter(id__in=done).delete()
+        purged += len(done)
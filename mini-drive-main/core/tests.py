@@ -0,0 +1,817 @@
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core import signing
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import clients
+from .listings import (
+    FILE_SORTS,
+    bump_listing,
+    keyset_page,
+    listing_version,
+    sort_listing,
+)
+from .management.commands import fake_gemini_server
+from .models import (
+    Embedding,
+    File,
+    Folder,
+    FolderShareToken,
+    ListingVersion,
+    ProcessingRecord,
+    RelatedFile,
+    ShareToken,
+    StorageUsage,
+)
+from .profiling import wants_profile
+from .quota import QuotaUploadHandler, compute_usage, storage_used
+from .related import add_related, compute_related
+from .search import rank
+from .sharing import ShareRevoked, load_share, resolve_share_token, sign_share
+from .tasks import sweep_share_tokens
+from .totals import recompute_totals
+
+# Queries per request, whatever the number of rows involved
+QUERY_BUDGETS = {
+    # Both include the largest folders listed under the storage bar
+    "dashboard": 9,
+    "folder_detail": 10,
+    "listing_rows": 5,
+    "serve_folder_share": 8,
+    "api_files": 3,
+    "search_files": 4,
+    "search_api": 3,
+    "admin_files": 6,
+    "admin_folders": 5,
+    "admin_embeddings": 5,
+    "admin_share_tokens": 5,
+    "admin_folder_share_tokens": 5,
+}
+
+# Hot listing queries that must be served from an index
+EXPLAIN_QUERIES = {
+    "root files": lambda user, folder: File.objects.filter(
+        owner=user, folder=None
+    ).order_by("-uploaded"),
+    "folder files": lambda user, folder: File.objects.filter(
+        owner=user, folder=folder
+    ).order_by("-uploaded"),
+    "all files": lambda user, folder: File.objects.filter(owner=user).order_by(
+        "-uploaded"
+    ),
+    "subfolders": lambda user, folder: Folder.objects.filter(
+        owner=user, parent=folder
+    ).order_by("name"),
+    **{
+        f"folder files by {sort}": lambda user, folder, sort=sort: sort_listing(
+            File.objects.filter(owner=user, folder=folder), sort
+        )
+        for key in FILE_SORTS
+        for sort in (key, f"-{key}")
+    },
+    **{
+        f"subfolders by {sort}": lambda user, folder, sort=sort: sort_listing(
+            Folder.objects.filter(owner=user, parent=folder), sort
+        )
+        for key in FILE_SORTS
+        for sort in (key, f"-{key}")
+    },
+    "expired share tokens": lambda user, folder: ShareToken.objects.filter(
+        expiry__lt=timezone.now()
+    ),
+}
+
+EMBED_DIM = 8
+
+
+class FakeEmbeddings:
+    async def create(self, input, model):
+        item = mock.Mock(embedding=[1.0] * EMBED_DIM)
+        return mock.Mock(data=[item])
+
+
+class FakeAsyncOpenAI:
+    """Local stand-in for the OpenAI client used by the search views."""
+
+    def __init__(self, *args, **kwargs):
+        self.embeddings = FakeEmbeddings()
+
+    async def close(self):
+        pass
+
+
+def seed_tree(size):
+    """
+    Create a user with ``size`` folders per level, files and shares.
+
+    Returns the user, the first top-level folder and the URL of every
+    endpoint in QUERY_BUDGETS.
+    """
+    user = User.objects.create_user(
+        f"budget{size}", password="budget", is_staff=True, is_superuser=True
+    )
+    now = timezone.now()
+
+    def add_files(folder, count):
+        files = File.objects.bulk_create(
+            File(
+                owner=user,
+                folder=folder,
+                name=f"{folder.id if folder else 'root'}-{i}.txt",
+                file=f"files/seed-{size}-{i}.txt",
+                size=1024,
+                mime_type="text/plain",
+                processed=True,
+            )
+            for i in range(count)
+        )
+        Embedding.objects.bulk_create(
+            Embedding(
+                file=f,
+                vector=[0.5] * EMBED_DIM,
+                dimension=EMBED_DIM,
+                extracted_text="seed",
+            )
+            for f in files
+        )
+        ShareToken.objects.bulk_create(
+            ShareToken(file=f, expiry=now + timedelta(hours=1)) for f in files
+        )
+
+    add_files(None, size)
+    top = None
+    for i in range(size):
+        folder = Folder.objects.create(owner=user, name=f"top-{i}")
+        FolderShareToken.objects.create(
+            folder=folder, expiry=now + timedelta(hours=1)
+        )
+        add_files(folder, size)
+        top = top or folder
+
+    # A nested chain under the first folder, to exercise breadcrumbs
+    deepest = top
+    for depth in range(size):
+        deepest = Folder.objects.create(
+            owner=user, name=f"depth-{depth}", parent=deepest
+        )
+        add_files(deepest, size)
+
+    token = FolderShareToken.objects.create(
+        folder=top, expiry=now + timedelta(hours=1)
+    )
+    rows, cursor = keyset_page(
+        File.objects.filter(owner=user, folder=deepest), "name", size=1
+    )
+    return user, top, {
+        "dashboard": "/",
+        "folder_detail": f"/folder/{deepest.id}/",
+        "listing_rows": (
+            f"/rows/?folder={deepest.id}&kind=files&sort=name&cursor={cursor}"
+        ),
+        "serve_folder_share": f"/sf/{token.uuid}/?subfolder={deepest.id}",
+        "api_files": "/api/files/",
+        "search_files": "/search/?query=budget",
+        "search_api": "/api/search/?q=budget",
+        "admin_files": "/admin/core/file/",
+        "admin_folders": "/admin/core/folder/",
+        "admin_embeddings": "/admin/core/embedding/",
+        "admin_share_tokens": "/admin/core/sharetoken/",
+        "admin_folder_share_tokens": "/admin/core/foldersharetoken/",
+    }
+
+
+# The manifest storage needs collectstatic, which tests do not run
+TEST_STORAGES = {
+    **settings.STORAGES,
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MediaTestCase(TestCase):
+    """A test case whose uploads go to a throwaway MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        cls.addClassCleanup(media_override.disable)
+        super().setUpClass()
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class QueryBudgetTests(TestCase):
+    """Hot endpoints run a fixed number of queries, whatever the row count."""
+
+    @mock.patch("openai.AsyncOpenAI", FakeAsyncOpenAI)
+    def test_query_budgets(self):
+        for size in (3, 15):
+            user, top, endpoints = seed_tree(size)
+            self.client.force_login(user)
+            for name, url in endpoints.items():
+                with self.subTest(size=size, endpoint=name):
+                    # Warm up once so one-off work (e.g. seeding
+                    # StorageUsage) is not counted, then measure the
+                    # uncached path of cached listings
+                    self.client.get(url)
+                    cache.clear()
+                    with self.assertNumQueries(QUERY_BUDGETS[name]):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+def query_plan(queryset, label):
+    """
+    EXPLAIN ``queryset`` (SQLite) under a statement text tagged by ``label``.
+
+    sqlite3 caches prepared statements by their text, and an EXPLAIN prepared
+    before an index was dropped keeps reporting the old plan.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql} -- {label}", params)
+        return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+
+def plan_problems(plan):
+    """Plan rows that scan a whole table or sort outside an index (SQLite)."""
+    return [
+        row
+        for row in plan.splitlines()
+        # "SCAN <table>" without an index reads every row...
+        if ("SCAN " in row and "INDEX" not in row)
+        # ...and "USE TEMP B-TREE" sorts rows the index did not
+        or "TEMP B-TREE" in row
+    ]
+
+
+def indexed_terms(plan):
+    """Constraints the plan looks up in indexes: 2 for (owner_id=? AND folder_id=?)."""
+    return sum(row.count("?") for row in plan.splitlines() if "INDEX" in row)
+
+
+@skipUnless(connection.vendor == "sqlite", "Reads SQLite query plans")
+class IndexPlanTests(TestCase):
+    """Hot listing queries are served by indexes, and need them."""
+
+    def test_hot_queries_use_indexes(self):
+        user, top, endpoints = seed_tree(3)
+        for name, build in EXPLAIN_QUERIES.items():
+            with self.subTest(query=name):
+                after = query_plan(build(user, top), "after")
+                self.assertEqual(plan_problems(after), [], after)
+
+                # Before: the same query without the indexes it picked
+                indexes = re.findall(r"USING (?:COVERING )?INDEX (\w+)", after)
+                self.assertTrue(indexes, after)
+                savepoint = transaction.savepoint()
+                with connection.cursor() as cursor:
+                    for index in indexes:
+                        quoted = connection.ops.quote_name(index)
+                        cursor.execute(f"DROP INDEX {quoted}")
+                before = query_plan(build(user, top), "before")
+                transaction.savepoint_rollback(savepoint)
+                # ...scans, sorts or narrows the rows down less
+                self.assertTrue(
+                    plan_problems(before)
+                    or indexed_terms(before) < indexed_terms(after),
+                    f"{before}\nis no worse than\n{after}",
+                )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class FolderDeleteTests(TestCase):
+    """Deleting a folder removes every row that points into its subtree."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("owner", password="owner")
+        self.client.force_login(self.user)
+        self.folder = Folder.objects.create(owner=self.user, name="top")
+        self.subfolder = Folder.objects.create(
+            owner=self.user, name="sub", parent=self.folder
+        )
+        self.file = File.objects.create(
+            owner=self.user,
+            folder=self.subfolder,
+            name="inside.txt",
+            file="files/inside.txt",
+            size=10,
+        )
+
+    def assert_deleted(self, *kept):
+        response = self.client.post(f"/folder/{self.folder.id}/delete/")
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Folder.objects.filter(owner=self.user).exists())
+        self.assertQuerySetEqual(
+            File.objects.filter(owner=self.user), kept, ordered=False
+        )
+
+    def test_delete_folder_with_shares(self):
+        expiry = timezone.now() + timedelta(hours=1)
+        FolderShareToken.objects.create(folder=self.subfolder, expiry=expiry)
+        ShareToken.objects.create(file=self.file, expiry=expiry)
+        self.assert_deleted()
+        self.assertFalse(FolderShareToken.objects.exists())
+        self.assertFalse(ShareToken.objects.exists())
+
+    def test_delete_folder_with_related_files(self):
+        outside = File.objects.create(
+            owner=self.user, name="outside.txt", file="files/outside.txt", size=10
+        )
+        # In each other's lists: one row in the subtree, one pointing into it
+        RelatedFile.objects.create(file=self.file, related=outside, similarity=0.9)
+        RelatedFile.objects.create(file=outside, related=self.file, similarity=0.9)
+        Embedding.objects.create(file=self.file, vector=[1.0])
+        self.assert_deleted(outside)
+        self.assertFalse(RelatedFile.objects.exists())
+
+    def test_admin_delete_parent_with_child(self):
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        other = Folder.objects.create(owner=self.user, name="other")
+        response = self.client.post(
+            "/admin/core/folder/",
+            {
+                "action": "delete_selected",
+                "post": "yes",
+                "_selected_action": [self.subfolder.id, self.folder.id],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertQuerySetEqual(Folder.objects.all(), [other])
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(
+            ListingVersion.objects.exclude(folder__isnull=True)
+            .exclude(folder=other)
+            .exists()
+        )
+
+    def test_bump_listing_of_deleted_folder(self):
+        folder_id = self.subfolder.id
+        ListingVersion.objects.filter(folder_id=folder_id).delete()
+        Folder.objects.filter(id=folder_id).delete()
+        bump_listing(self.user.id, folder_id)
+        self.assertFalse(ListingVersion.objects.filter(folder_id=folder_id).exists())
+
+
+async def read_stream(content):
+    return b"".join([chunk async for chunk in content])
+
+
+class ChatStreamTests(TestCase):
+    """Chat replies stream from a local stand-in for the Gemini API."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = fake_gemini_server.start_server(delay=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        host, port = self.server.server_address
+        settings_override = override_settings(
+            GEMINI_API_BASE=f"http://{host}:{port}", GEMINI_API_KEY="stand-in"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user("chatter", password="chatter")
+        self.client.force_login(self.user)
+
+    def events(self, **params):
+        response = self.client.get("/chat_with_gemini/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # Read on an event loop of its own, as WSGI serves an async stream
+        body = async_to_sync(read_stream)(response.streaming_content)
+        events = []
+        for block in body.decode().split("\n\n"):
+            if block:
+                lines = dict(line.split(": ", 1) for line in block.split("\n"))
+                events.append((lines.get("event"), json.loads(lines["data"])))
+        return events
+
+    def test_streams_reply(self):
+        events = self.events(prompt="Where is the budget?")
+        words = [data["text"] for event, data in events if event is None]
+        self.assertGreater(len(words), 1)
+        self.assertEqual(
+            "".join(words).strip(),
+            "You asked: Where is the budget? (grounded in 0 excerpts)",
+        )
+        self.assertEqual(events[-1], ("done", {}))
+
+    def test_grounded_reply_lists_sources(self):
+        file = File.objects.create(
+            owner=self.user, name="budget.txt", file="files/budget.txt", size=10
+        )
+        Embedding.objects.create(
+            file=file, vector=[1.0], extracted_text="The quarterly budget is here."
+        )
+        events = self.events(prompt="Where is the budget?", context="true")
+        self.assertEqual(events[0], ("sources", ["budget.txt"]))
+        reply = "".join(data["text"] for event, data in events if event is None)
+        self.assertIn("grounded in 1 excerpts", reply)
+        self.assertEqual(events[-1], ("done", {}))
+
+    def test_client_closed_with_request_loop(self):
+        self.events(prompt="Hello")
+        # Each request ran on its own event loop; its client went with it
+        self.assertEqual(clients._clients, {})
+
+
+class WantsProfileTests(TestCase):
+    def test_trigger(self):
+        factory = RequestFactory()
+        self.assertTrue(wants_profile(factory.get("/?_profile=1")))
+        self.assertTrue(wants_profile(factory.get("/?a=b&_profile=1")))
+        self.assertTrue(wants_profile(factory.get("/", HTTP_X_PROFILE="1")))
+        for query in ("", "x_profile=1", "_profile=10", "_profile=0", "a=_profile=1"):
+            with self.subTest(query=query):
+                self.assertFalse(wants_profile(factory.get(f"/?{query}")))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProcessingErrorFilterTests(TestCase):
+    def test_filter_by_error_class(self):
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        files = {}
+        for error_class in ("RateLimitError", "KeyError", "", None):
+            file = files[error_class] = File.objects.create(
+                owner=admin, name=f"{error_class}.txt", file="files/x.txt", size=1
+            )
+            if error_class is not None:
+                ProcessingRecord.objects.create(
+                    file=file,
+                    status="failed" if error_class else "success",
+                    error_class=error_class,
+                    total_ms=1,
+                    cpu_ms=1,
+                    bytes_in=1,
+                    processed_at=timezone.now(),
+                )
+        cases = [("RateLimitError", "RateLimitError"), ("other", "KeyError")]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                response = self.client.get(
+                    "/admin/core/file/", {"processing_error": value}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertQuerySetEqual(
+                    response.context["cl"].queryset, [files[expected]]
+                )
+
+
+class RankTests(TestCase):
+    def test_zero_vectors_rank_last(self):
+        embeddings = [Embedding(vector=[0.0, 0.0]), Embedding(vector=[1.0, 1.0])]
+        ranked = rank([1.0, 0.0], embeddings)
+        self.assertEqual([pair[0] for pair in ranked], embeddings[::-1])
+        self.assertEqual(ranked[1][1], 0.0)
+        self.assertEqual([pair[1] for pair in rank([0.0, 0.0], embeddings)], [0.0, 0.0])
+
+
+class RelatedFilesTests(TestCase):
+    """Maintaining related files incrementally matches a full rebuild."""
+
+    def pairs(self):
+        return set(RelatedFile.objects.values_list("file_id", "related_id"))
+
+    def test_incremental_matches_rebuild(self):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        user = User.objects.create_user("relator", password="relator")
+        centres = rng.normal(size=(4, 16))
+
+        def vector(i):
+            return (centres[i % 4] + rng.normal(scale=0.5, size=16)).tolist()
+
+        files = []
+        for i in range(40):
+            file = File.objects.create(
+                owner=user, name=f"{i}.txt", file=f"files/{i}.txt", size=1
+            )
+            Embedding.objects.create(file=file, vector=vector(i))
+            add_related(file.id, k=5)
+            files.append(file)
+        # Reprocessing re-embeds a file, here moving it to another cluster
+        for i, file in enumerate(files[::5]):
+            embedding = Embedding.objects.get(file=file)
+            embedding.vector = vector(i + 1)
+            embedding.save()
+            add_related(file.id, k=5)
+
+        incremental = self.pairs()
+        self.assertEqual(compute_related(user.id, k=5), 200)
+        self.assertEqual(incremental, self.pairs())
+
+
+@mock.patch("core.views.postprocess_files")
+class BulkUploadTests(MediaTestCase):
+    """Bulk uploads do by hand what the File signals do for single saves."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("bulk", password="bulk")
+        self.client.force_login(self.user)
+        self.photos = Folder.objects.create(owner=self.user, name="photos")
+        File.objects.create(
+            owner=self.user,
+            folder=self.photos,
+            name="a.txt",
+            file="files/a.txt",
+            size=5,
+        )
+        # Seed the usage row, so the upload has to update it
+        storage_used(self.user)
+
+    def upload(self, paths, folder=None):
+        data = {
+            "files": [
+                SimpleUploadedFile(path.rsplit("/", 1)[-1], b"x" * (i + 1))
+                for i, path in enumerate(paths)
+            ],
+            "paths": paths,
+        }
+        if folder:
+            data["folder"] = folder.id
+        return self.client.post("/api/upload/bulk/", data)
+
+    def test_nested_paths_resolve_to_folders(self, postprocess_files):
+        response = self.upload(
+            ["photos/a.txt", "photos/2024/b.txt", "photos/2024/jan/c.txt", "d.txt"]
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            [item["path"] for item in response.json()["skipped"]], ["photos/a.txt"]
+        )
+
+        # The existing folder is reused and the missing ones are created
+        # under it, with their materialised paths filled in
+        year = Folder.objects.get(owner=self.user, name="2024")
+        month = Folder.objects.get(owner=self.user, name="jan")
+        self.assertEqual(Folder.objects.filter(owner=self.user).count(), 3)
+        self.assertEqual(year.parent, self.photos)
+        self.assertEqual(month.parent, year)
+        self.assertEqual(month.path, Folder.build_path(year, month.id))
+
+        placed = dict(
+            File.objects.filter(owner=self.user).values_list("name", "folder")
+        )
+        self.assertEqual(
+            placed,
+            {
+                "a.txt": self.photos.id,
+                "b.txt": year.id,
+                "c.txt": month.id,
+                "d.txt": None,
+            },
+        )
+        postprocess_files.delay.assert_called_once()
+
+    def test_upload_into_folder(self, postprocess_files):
+        response = self.upload(["x/e.txt"], folder=self.photos)
+        self.assertEqual(response.status_code, 201, response.content)
+        x = Folder.objects.get(owner=self.user, name="x")
+        self.assertEqual(x.parent, self.photos)
+        self.assertTrue(File.objects.filter(folder=x, name="e.txt").exists())
+
+    def test_usage_totals_and_listings_follow(self, postprocess_files):
+        before = {
+            folder_id: listing_version(self.user.id, folder_id)
+            for folder_id in (None, self.photos.id)
+        }
+        response = self.upload(["photos/b.txt", "photos/new/c.txt", "d.txt"])
+        self.assertEqual(response.status_code, 201, response.content)
+
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual(
+            {"bytes_used": usage.bytes_used, "file_count": usage.file_count},
+            compute_usage(self.user.id),
+        )
+        # Nothing for a full recompute to correct
+        self.assertEqual(recompute_totals(Folder.objects.filter(owner=self.user)), [])
+        self.photos.refresh_from_db()
+        self.assertEqual(
+            (self.photos.total_size, self.photos.total_files), (5 + 1 + 2, 3)
+        )
+
+        new = Folder.objects.get(owner=self.user, name="new")
+        for folder_id, version in before.items():
+            self.assertGreater(listing_version(self.user.id, folder_id), version)
+        self.assertGreater(listing_version(self.user.id, new.id), 0)
+
+
+class SignedShareTests(MediaTestCase):
+    """Signed share links verify without a lookup, unless revoked."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("sharer", password="sharer")
+        self.client.force_login(self.user)
+        self.file = File.objects.create(
+            owner=self.user,
+            name="note.txt",
+            file=SimpleUploadedFile("note.txt", b"shared"),
+            size=6,
+        )
+
+    def share(self):
+        response = self.client.post(f"/api/files/{self.file.id}/signed-share/")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["token"]
+
+    def get_shared(self, token):
+        return self.client.get(f"/ss/{token}/")
+
+    def test_valid_link(self):
+        token = self.share()
+        self.assertEqual(load_share(token, "file")["id"], self.file.id)
+        self.client.logout()
+        response = self.get_shared(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"shared")
+
+    def test_tampered_or_expired_link(self):
+        token = self.share()
+        tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+        expired, _ = sign_share("file", self.file.id, timedelta(seconds=-1))
+        folder_token, _ = sign_share("folder", self.file.id)
+        cases = [
+            (tampered, signing.BadSignature),
+            (expired, signing.SignatureExpired),
+            (folder_token, signing.BadSignature),
+        ]
+        for bad, error in cases:
+            with self.subTest(error=error.__name__):
+                with self.assertRaises(error):
+                    load_share(bad, "file")
+                self.assertEqual(self.get_shared(bad).status_code, 404)
+
+    def test_revoked_link(self):
+        token = self.share()
+        other = self.share()
+        # Warm the revocation cache, so revoking has to clear it
+        self.assertEqual(self.get_shared(token).status_code, 200)
+
+        response = self.client.post("/api/signed-share/revoke/", {"token": token})
+        self.assertEqual(response.status_code, 204)
+        with self.assertRaises(ShareRevoked):
+            load_share(token, "file")
+        self.assertEqual(self.get_shared(token).status_code, 404)
+        # Only that link is revoked
+        self.assertEqual(self.get_shared(other).status_code, 200)
+
+
+@override_settings(MAX_STORAGE_MB=1)
+class UploadQuotaTests(MediaTestCase):
+    """Over-quota uploads are refused from their Content-Length alone."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("full", password="full")
+        self.client.force_login(self.user)
+        File.objects.create(
+            owner=self.user, name="big.bin", file="files/big.bin", size=1024 * 1024 - 10
+        )
+        storage_used(self.user)
+
+    def test_over_quota_uploads_get_413(self):
+        for url in ("/upload/", "/api/upload/", "/api/upload/bulk/"):
+            with self.subTest(url=url), mock.patch.object(
+                QuotaUploadHandler, "receive_data_chunk"
+            ) as receive_data_chunk:
+                upload = SimpleUploadedFile("more.bin", b"x" * 128 * 1024)
+                field = "files" if url.endswith("bulk/") else "file"
+                response = self.client.post(url, {field: upload})
+                self.assertEqual(response.status_code, 413)
+                # Refused before any of the body was read
+                receive_data_chunk.assert_not_called()
+        self.assertEqual(File.objects.filter(owner=self.user).count(), 1)
+
+
+class ShareTokenCacheTests(TestCase):
+    """Cached share tokens follow changes to the token and its target."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("tokens", password="tokens")
+        self.folder = Folder.objects.create(owner=self.user, name="shared")
+        self.file = File.objects.create(
+            owner=self.user,
+            folder=self.folder,
+            name="a.txt",
+            file="files/a.txt",
+            size=1,
+        )
+
+    def test_changed_token_is_forgotten(self):
+        token = ShareToken.objects.create(
+            file=self.file, expiry=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(
+            resolve_share_token(ShareToken, token.uuid)["target_id"], self.file.id
+        )
+
+        token.expiry = timezone.now() - timedelta(minutes=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.save()
+        self.assertIsNone(resolve_share_token(ShareToken, token.uuid))
+
+        token.expiry = timezone.now() + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.save()
+        self.assertIsNotNone(resolve_share_token(ShareToken, token.uuid))
+        with self.captureOnCommitCallbacks(execute=True):
+            token.delete()
+        self.assertIsNone(resolve_share_token(ShareToken, token.uuid))
+
+    def test_moved_folder_is_forgotten(self):
+        token = ShareToken.objects.create(
+            file=self.file, expiry=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(
+            resolve_share_token(ShareToken, token.uuid)["path"], self.folder.path
+        )
+        parent = Folder.objects.create(owner=self.user, name="parent")
+        self.folder.parent = parent
+        with self.captureOnCommitCallbacks(execute=True):
+            self.folder.save()
+        self.assertEqual(
+            resolve_share_token(ShareToken, token.uuid)["path"],
+            Folder.build_path(parent, self.folder.id),
+        )
+
+    def test_sweep_removes_expired_tokens(self):
+        now = timezone.now()
+        live = [
+            ShareToken.objects.create(file=self.file, expiry=now + timedelta(hours=1)),
+            self.folder.create_share_link(),
+        ]
+        for hours in (1, 2, 3):
+            expiry = now - timedelta(hours=hours)
+            ShareToken.objects.create(file=self.file, expiry=expiry)
+            FolderShareToken.objects.create(folder=self.folder, expiry=expiry)
+
+        self.assertEqual(sweep_share_tokens(batch_size=2), 6)
+        self.assertQuerySetEqual(ShareToken.objects.all(), live[:1])
+        self.assertQuerySetEqual(FolderShareToken.objects.all(), live[1:])
+
+
+class RepairTotalsTests(TestCase):
+    """repair_folder_totals restores the totals the signals maintain."""
+
+    def test_repair_restores_totals(self):
+        user = User.objects.create_user("drift", password="drift")
+        top = Folder.objects.create(owner=user, name="top")
+        middle = Folder.objects.create(owner=user, name="middle", parent=top)
+        bottom = Folder.objects.create(owner=user, name="bottom", parent=middle)
+        empty = Folder.objects.create(owner=user, name="empty", parent=top)
+        for folder, size in ((top, 1), (middle, 10), (bottom, 100), (bottom, 1000)):
+            File.objects.create(
+                owner=user,
+                folder=folder,
+                name=f"{size}.txt",
+                file=f"files/{size}.txt",
+                size=size,
+            )
+        Folder.objects.update(total_size=7, total_files=7)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("repair_folder_totals", stdout=io.StringIO())
+        # The folders are passed as a subquery rather than one variable per id
+        [sums] = [q["sql"] for q in queries if 'FROM "core_file"' in q["sql"]]
+        self.assertIn("IN (SELECT", sums)
+
+        self.assertEqual(
+            {
+                folder.id: (folder.total_size, folder.total_files)
+                for folder in Folder.objects.all()
+            },
+            {
+                top.id: (1111, 4),
+                middle.id: (1110, 3),
+                bottom.id: (1100, 2),
+                empty.id: (0, 0),
+            },
+        )
+        self.assertEqual(recompute_totals(), [])
@@ -0,0 +1,140 @@
+"""
+Recursive size and file count of every folder.
+
+``Folder.total_size`` and ``Folder.total_files`` cover the folder's whole
+subtree. They are kept up to date incrementally: a file added, removed or
+moved applies its delta to its folder and every ancestor (read off the
+materialised path) in one UPDATE, instead of listings summing subtrees on
+read. ``recompute_totals`` rebuilds them bottom-up in one pass, for the
+``repair_folder_totals`` command and after bulk inserts.
+"""
+
+from collections import defaultdict
+from django.db.models import Count, F, Sum
+from .listings import bump_listings
+
+
+def path_ids(path):
+    return [int(part) for part in path.strip("/").split("/") if part]
+
+
+def apply_file_deltas(deltas):
+    """
+    Add ``{folder_id: (bytes, files)}`` deltas to the folders and ancestors.
+
+    ``deltas`` describes files added directly to (or, negative, removed
+    from) each folder; root files (``None``) affect no folder. The listings
+    showing the changed folder rows, i.e. their parents', are invalidated.
+    """
+    from .models import Folder
+
+    deltas = {
+        folder_id: delta
+        for folder_id, delta in deltas.items()
+        if folder_id is not None and any(delta)
+    }
+    if not deltas:
+        return
+
+    folders = Folder.objects.filter(id__in=deltas).values_list("id", "owner_id", "path")
+    totals = defaultdict(lambda: [0, 0])
+    listings = set()
+    for folder_id, owner_id, path in folders:
+        chain = path_ids(path)
+        for ancestor_id in chain:
+            totals[ancestor_id][0] += deltas[folder_id][0]
+            totals[ancestor_id][1] += deltas[folder_id][1]
+        listings.update((owner_id, parent_id) for parent_id in [None] + chain[:-1])
+
+    # One UPDATE per distinct delta: a single file's chain is one statement
+    by_delta = defaultdict(list)
+    for folder_id, delta in totals.items():
+        by_delta[tuple(delta)].append(folder_id)
+    for (size, count), folder_ids in by_delta.items():
+        Folder.objects.filter(id__in=folder_ids).update(
+            total_size=F("total_size") + size, total_files=F("total_files") + count
+        )
+    bump_listings(listings)
+
+
+def move_subtree_totals(folder, old_path, new_path):
+    """Carry a moved folder's totals from its old ancestors to its new ones."""
+    from .models import Folder
+
+    size, count = (
+        Folder.objects.filter(pk=folder.pk)
+        .values_list("total_size", "total_files")
+        .get()
+    )
+    if not size and not count:
+        return
+    # The folder itself is last in both paths and keeps its totals
+    for chain, sign in ((path_ids(old_path)[:-1], -1), (path_ids(new_path)[:-1], 1)):
+        Folder.objects.filter(id__in=chain).update(
+            total_size=F("total_size") + sign * size,
+            total_files=F("total_files") + sign * count,
+        )
+    bump_listings(
+        (folder.owner_id, parent_id)
+        for path in (old_path, new_path)
+        for parent_id in [None] + path_ids(path)[:-2]
+    )
+
+
+def recompute_totals(folders=None, save=True):
+    """
+    Recompute the totals of ``folders`` (default all) from the File table.
+
+    Direct file sums come from one grouped query; folders are then visited
+    deepest first, each adding its totals to its parent. ``folders`` must
+    hold whole trees (e.g. every folder of some owners). Returns
+    ``(folder_id, stored, actual)`` for every folder whose stored
+    ``(total_size, total_files)`` were wrong, fixing them unless ``save`` is
+    false.
+    """
+    from .models import File, Folder
+
+    if folders is None:
+        folders = Folder.objects.all()
+    rows = list(
+        folders.order_by().values_list(
+            "id", "owner_id", "parent_id", "path", "total_size", "total_files"
+        )
+    )
+    direct = {
+        row["folder"]: [row["size"] or 0, row["count"]]
+        # A subquery: an id list could exceed SQLite's variable limit
+        for row in File.objects.filter(folder__in=folders.order_by().values("id"))
+        .order_by()
+        .values("folder")
+        .annotate(size=Sum("size"), count=Count("id"))
+    }
+
+    totals = {row[0]: direct.get(row[0], [0, 0]) for row in rows}
+    # Deepest first, so children are complete before they reach the parent
+    for folder_id, owner_id, parent_id, path, *_ in sorted(
+        rows, key=lambda row: row[3].count("/"), reverse=True
+    ):
+        if parent_id in totals:
+            totals[parent_id][0] += totals[folder_id][0]
+            totals[parent_id][1] += totals[folder_id][1]
+
+    wrong = [row for row in rows if [row[4], row[5]] != totals[row[0]]]
+    if save:
+        Folder.objects.bulk_update(
+            [
+                Folder(
+                    id=folder_id,
+                    total_size=totals[folder_id][0],
+                    total_files=totals[folder_id][1],
+                )
+                for folder_id, *_ in wrong
+            ],
+            ["total_size", "total_files"],
+            batch_size=500,
+        )
+        bump_listings((owner_id, parent_id) for _, owner_id, parent_id, *_ in wrong)
+    return [
+        (folder_id, (size, count), tuple(totals[folder_id]))
+        for folder_id, owner_id, parent_id, path, size, count in wrong
+    ]
@@ -9,6 +9,7 @@ urlpatterns = [
     path("register/", views.register, name="register"),
     # Folder Management
     path("folder/<int:folder_id>/", views.folder_detail, name="folder_detail"),
+    path("rows/", views.listing_rows, name="listing_rows"),
     path("folder/create/", views.create_folder, name="create_folder"),
     path("folder/<int:folder_id>/delete/", views.delete_folder, name="delete_folder"),
     path(
@@ -29,11 +30,45 @@ urlpatterns = [
     path("delete/<int:file_id>/", views.delete_file, name="delete_file"),
     path("search/", views.search_files, name="search_files"),
     path("share/<int:file_id>/", views.create_share, name="create_share"),
+    path("related/<int:file_id>/", views.related_files, name="related_files"),
     path("s/<uuid:uuid>/", views.serve_share, name="serve_share"),
+    # Signed (stateless) share links
+    path("ss/<str:token>/", views.serve_signed_share, name="serve_signed_share"),
+    path(
+        "ssf/<str:token>/",
+        views.serve_signed_folder_share,
+        name="serve_signed_folder_share",
+    ),
+    path(
+        "ssf/<str:token>/file/<int:file_id>/",
+        views.serve_signed_shared_file,
+        name="serve_signed_shared_file",
+    ),
     # API endpoints
     path("api/files/", views.FileListAPI.as_view(), name="api_files"),
     path("api/upload/", views.FileUploadAPI.as_view(), name="api_upload"),
+    path(
+        "api/upload/bulk/", views.BulkFileUploadAPI.as_view(), name="api_upload_bulk"
+    ),
     path("api/search/", views.search_api, name="api_search"),
+    path(
+        "api/files/<int:object_id>/signed-share/",
+        views.signed_share_api,
+        {"scope": "file"},
+        name="api_signed_share_file",
+    ),
+    path(
+        "api/folders/<int:object_id>/signed-share/",
+        views.signed_share_api,
+        {"scope": "folder"},
+        name="api_signed_share_folder",
+    ),
+    path(
+        "api/signed-share/revoke/",
+        views.revoke_signed_share_api,
+        name="api_revoke_signed_share",
+    ),
     
      path("chat_with_gemini/", views.chat_with_gemini, name="chat_with_gemini"),
+    path("metrics", views.metrics, name="metrics"),
 ]
@@ -1,90 +1,213 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-import os
-import google.generativeai as genai
+import json
 
 
 
-import numpy as np
 from datetime import datetime
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, Http404, JsonResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.contrib import messages
-from django.views.decorators.http import require_POST
-from django.db.models import Sum
+from django.views.decorators.http import require_GET, require_POST
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch, prefetch_related_objects
+from django.core import signing
 from django.core.exceptions import PermissionDenied
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlencode
+from rest_framework.authentication import BasicAuthentication
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework import status
-from openai import OpenAI
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from django.contrib.auth import login
 
-from .models import File, Embedding, ShareToken, Folder, FolderShareToken
+from .models import File, ShareToken, Folder, FolderShareToken, RelatedFile
 from .forms import FileUploadForm, SearchForm, UserRegistrationForm
-from .serializers import FileSerializer, ShareTokenSerializer, FileUploadSerializer
-from .tasks import postprocess_file
+from .serializers import (
+    FileSerializer,
+    FileListSerializer,
+    ShareTokenSerializer,
+    FileUploadSerializer,
+    BulkFileUploadSerializer,
+)
+from .tasks import postprocess_file, postprocess_files
+from .filters import FileCursorPagination, filter_files, parse_boolean, parse_fields
+from .listings import keyset_page, parse_sort, render_listing
+from .metrics import export as export_metrics
+from .search import search_files as rank_user_files
+from .quota import storage_used, upload_quota_guard, UploadQuotaMixin
+from .sharing import (
+    sign_share,
+    load_share,
+    revoke_share,
+    share_expiry,
+    resolve_share_token,
+)
+
+# Folders listed under the storage bar
+LARGEST_FOLDERS = 3
 
 
+# HTML Views
+
+
+def with_share_tokens(queryset):
+    """Prefetch the unexpired share tokens the listing templates display."""
+    if queryset.model is Folder:
+        lookup, token_model = "foldersharetoken_set", FolderShareToken
+    else:
+        lookup, token_model = "sharetoken_set", ShareToken
+    return queryset.prefetch_related(
+        Prefetch(lookup, queryset=token_model.objects.filter(expiry__gt=timezone.now()))
+    )
 
-# Configure Gemini with API key
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Helper function to ask Gemini
-def ask_gemini(prompt):
-    model = genai.GenerativeModel("gemini-pro")
-    response = model.generate_content(prompt)
-    return response.text
+def listing_page(request, kind, folder, sort, cursor=None):
+    """
+    One page of a listing's folder or file rows, and the URL of the next page.
 
-# HTML Views
+    ``kind`` is "folders" or "files"; ``folder`` is None for the root.
+    """
+    if kind == "folders":
+        rows = Folder.objects.filter(owner=request.user, parent=folder)
+    else:
+        rows = File.objects.filter(owner=request.user, folder=folder)
+    rows, cursor = keyset_page(with_share_tokens(rows), sort, cursor)
+    next_url = None
+    if cursor:
+        query = {"folder": folder.id if folder else "root", "kind": kind}
+        if sort:
+            query["sort"] = sort
+        query["cursor"] = cursor
+        next_url = f"{reverse('listing_rows')}?{urlencode(query)}"
+    return rows, next_url
+
+
+def listing_context(request, folder):
+    """First pages of a folder's (None: the root's) subfolders and files."""
+    sort = parse_sort(request.GET.get("sort"))
+    folders, folders_next = listing_page(request, "folders", folder, sort)
+    files, files_next = listing_page(request, "files", folder, sort)
+    return {
+        "folders": folders,
+        "folders_next": folders_next,
+        "files": files,
+        "files_next": files_next,
+        "sort": sort,
+    }
+
+
+def storage_stats(user):
+    """Storage bar figures and largest folders for the dashboard and folder pages."""
+    storage_used_mb = storage_used(user) / (1024 * 1024)
+    storage_limit_mb = settings.MAX_STORAGE_MB
+    storage_percent = (
+        (storage_used_mb / storage_limit_mb) * 100 if storage_limit_mb > 0 else 0
+    )
+    return {
+        "storage_used_mb": round(storage_used_mb, 2),
+        "storage_limit_mb": storage_limit_mb,
+        "storage_percent": min(100, round(storage_percent, 1)),
+        # Recursive totals make this one indexed query, whatever the nesting
+        "largest_folders": Folder.objects.filter(owner=user, total_size__gt=0)
+        .order_by("-total_size")
+        .only("id", "name", "total_size")[:LARGEST_FOLDERS],
+    }
+
+
+def server_sent_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 
 @login_required
-def chat_with_gemini(request):
+async def chat_with_gemini(request):
+    """
+    Stream a Gemini reply to ``prompt`` as server-sent events.
+
+    Each chunk of text is sent as a ``data`` event, followed by a ``done`` (or
+    ``error``) event. With ``context=true`` the answer is grounded in the top
+    ``k`` chunks of the user's own files, listed first in a ``sources``
+    event. ``stream=false`` returns the whole reply as JSON instead.
+    """
+    from .chat import ChatError, retrieve_context, stream_reply
+
+    user = await request.auser()
     user_prompt = request.GET.get("prompt", "Hello Gemini!")
-    gemini_response = ask_gemini(user_prompt)
-    return JsonResponse({"response": gemini_response})
+    try:
+        grounded = parse_boolean(request.GET, "context")
+        stream = parse_boolean(request.GET, "stream")
+        k = min(max(int(request.GET.get("k", 3)), 1), 10)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+    except ValueError:
+        return JsonResponse({"k": "Expected an integer."}, status=400)
+
+    context = await retrieve_context(user.id, user_prompt, k) if grounded else []
+    sources = list(dict.fromkeys(name for name, chunk in context))
+
+    if stream is False:
+        try:
+            reply = "".join([text async for text in stream_reply(user_prompt, context)])
+        except ChatError as e:
+            return JsonResponse({"error": str(e)}, status=502)
+        return JsonResponse({"response": reply, "sources": sources})
+
+    async def events():
+        if sources:
+            yield server_sent_event(sources, "sources")
+        try:
+            async for text in stream_reply(user_prompt, context):
+                yield server_sent_event({"text": text})
+        except ChatError as e:
+            yield server_sent_event({"error": str(e)}, "error")
+        else:
+            yield server_sent_event({}, "done")
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 @login_required
 def dashboard(request):
     """Main dashboard showing root folders and files."""
-    # Get root folders (no parent)
-    root_folders = Folder.objects.filter(owner=request.user, parent=None).order_by(
-        "name"
-    )
-    # Get root files (no folder)
-    root_files = File.objects.filter(owner=request.user, folder=None).order_by(
-        "-uploaded"
-    )
-
-    # Calculate storage usage
-    storage_used = (
-        File.objects.filter(owner=request.user).aggregate(total=Sum("size"))["total"]
-        or 0
-    )
-    storage_used_mb = storage_used / (1024 * 1024)
-    storage_limit_mb = settings.MAX_STORAGE_MB
-    storage_percent = (
-        (storage_used_mb / storage_limit_mb) * 100 if storage_limit_mb > 0 else 0
-    )
 
     return render(
         request,
         "dashboard.html",
         {
-            "folders": root_folders,
-            "files": root_files,
+            # Root folders (no parent) and root files (no folder)
+            "listing": render_listing(
+                request,
+                "partials/dashboard_listing.html",
+                request.user.id,
+                None,
+                lambda: listing_context(request, None),
+                sort=parse_sort(request.GET.get("sort")),
+            ),
             "current_folder": None,
             "breadcrumbs": [],
-            "storage_used_mb": round(storage_used_mb, 2),
-            "storage_limit_mb": storage_limit_mb,
-            "storage_percent": min(100, round(storage_percent, 1)),
+            **storage_stats(request.user),
         },
     )
 
@@ -95,39 +218,56 @@ def folder_detail(request, folder_id):
     folder = get_object_or_404(Folder, id=folder_id)
 
     # Check permissions
-    if folder.owner != request.user:
+    if folder.owner_id != request.user.id:
         raise PermissionDenied("You don't have permission to access this folder.")
 
-    # Get subfolders and files
-    subfolders = folder.children.all().order_by("name")
-    files = folder.files.all().order_by("-uploaded")
-
-    # Calculate storage usage (same as dashboard)
-    storage_used = (
-        File.objects.filter(owner=request.user).aggregate(total=Sum("size"))["total"]
-        or 0
-    )
-    storage_used_mb = storage_used / (1024 * 1024)
-    storage_limit_mb = settings.MAX_STORAGE_MB
-    storage_percent = (
-        (storage_used_mb / storage_limit_mb) * 100 if storage_limit_mb > 0 else 0
-    )
-
     return render(
         request,
         "folder_detail.html",
         {
-            "folders": subfolders,
-            "files": files,
+            "listing": render_listing(
+                request,
+                "partials/folder_listing.html",
+                request.user.id,
+                folder.id,
+                lambda: {**listing_context(request, folder), "current_folder": folder},
+                sort=parse_sort(request.GET.get("sort")),
+            ),
             "current_folder": folder,
             "breadcrumbs": folder.get_breadcrumbs(),
-            "storage_used_mb": round(storage_used_mb, 2),
-            "storage_limit_mb": storage_limit_mb,
-            "storage_percent": min(100, round(storage_percent, 1)),
+            **storage_stats(request.user),
         },
     )
 
 
+@login_required
+@require_GET
+def listing_rows(request):
+    """The next page of folder or file rows of a listing, loaded on scroll."""
+    kind = request.GET.get("kind")
+    folder_id = request.GET.get("folder", "root")
+    if kind not in ("folders", "files") or not request.GET.get("cursor"):
+        return HttpResponseBadRequest("Expected a kind and a cursor.")
+    if folder_id != "root" and not folder_id.isdigit():
+        return HttpResponseBadRequest("Expected a folder id or 'root'.")
+    folder = None
+    if folder_id != "root":
+        folder = get_object_or_404(Folder, id=folder_id)
+        if folder.owner_id != request.user.id:
+            raise PermissionDenied("You don't have permission to access this folder.")
+
+    rows, next_url = listing_page(
+        request,
+        kind,
+        folder,
+        parse_sort(request.GET.get("sort")),
+        request.GET["cursor"],
+    )
+    return render(
+        request, "partials/listing_rows.html", {kind: rows, "next_url": next_url}
+    )
+
+
 @login_required
 @require_POST
 def create_folder(request):
@@ -198,6 +338,7 @@ def delete_folder(request, folder_id):
         return redirect("dashboard")
 
 
+@upload_quota_guard
 @login_required
 def upload_file(request):
     """File upload page and form handler."""
@@ -286,80 +427,59 @@ def create_folder_share(request, folder_id):
         return redirect("dashboard")
 
 
-def serve_folder_share(request, uuid):
+async def serve_folder_share(request, uuid):
     """Serve a shared folder and its contents."""
-    token = get_object_or_404(FolderShareToken, uuid=uuid)
+    share = await sync_to_async(load_share_token)(FolderShareToken, uuid)
+    root_folder = await aget_object_or_404(
+        Folder.objects.select_related("owner"), id=share["target_id"]
+    )
+    return await sync_to_async(render_shared_folder)(
+        request, root_folder, f"/sf/{uuid}/", share["expiry"]
+    )
 
-    # Check if token is expired
-    if timezone.now() > token.expiry:
-        raise Http404("This share link has expired.")
 
+def render_shared_folder(request, root_folder, share_url, expiry):
+    """Render a shared folder, or one of its subfolders, for a share link."""
     # Get subfolder if specified
     subfolder_id = request.GET.get("subfolder")
-    current_folder = token.folder
+    current_folder = root_folder
 
     if subfolder_id:
         try:
-            # Make sure this subfolder is actually a child of the shared folder
-            subfolder = Folder.objects.get(id=subfolder_id)
-
-            # Verify this is actually a subfolder of the shared folder (security check)
-            is_subfolder = False
-            parent = subfolder.parent
-            while parent:
-                if parent.id == token.folder.id:
-                    is_subfolder = True
-                    break
-                parent = parent.parent
-
-            if is_subfolder:
-                current_folder = subfolder
-            else:
-                raise Http404("Access denied to this folder.")
-        except Folder.DoesNotExist:
+            subfolder = Folder.objects.select_related("owner").get(id=subfolder_id)
+        except (Folder.DoesNotExist, ValueError):
             raise Http404("Folder not found.")
 
-    # Get contents
-    subfolders = current_folder.children.all().order_by("name")
-    files = current_folder.files.all().order_by("-uploaded")
+        # Verify this is actually a subfolder of the shared folder (security check)
+        if not subfolder.is_within(root_folder.id):
+            raise Http404("Access denied to this folder.")
+        current_folder = subfolder
 
-    # Build breadcrumbs
+    # Get contents
+    subfolders = Folder.objects.filter(
+        owner_id=current_folder.owner_id, parent=current_folder
+    ).order_by("name")
+    files = File.objects.filter(
+        owner_id=current_folder.owner_id, folder=current_folder
+    ).order_by("-uploaded")
+
+    # Build breadcrumbs from the shared root down to the current folder
     breadcrumbs = []
-    if current_folder.id != token.folder.id:
-        # Start with the root shared folder
-        breadcrumbs.append(
-            {
-                "id": token.folder.id,
-                "name": token.folder.name,
-                "url": f"/sf/{token.uuid}/",
-            }
-        )
-
-        # Add subfolder parents
-        temp_folder = current_folder.parent
-        collected_folders = []
-
-        while temp_folder and temp_folder.id != token.folder.id:
-            collected_folders.insert(
-                0,
+    if current_folder.id != root_folder.id:
+        ancestors = current_folder.get_breadcrumbs()
+        start = [f.id for f in ancestors].index(root_folder.id)
+        for crumb in ancestors[start:]:
+            breadcrumbs.append(
                 {
-                    "id": temp_folder.id,
-                    "name": temp_folder.name,
-                    "url": f"/sf/{token.uuid}/?subfolder={temp_folder.id}",
-                },
+                    "id": crumb.id,
+                    "name": crumb.name,
+                    "url": (
+                        share_url
+                        if crumb.id == root_folder.id
+                        else f"{share_url}?subfolder={crumb.id}"
+                    ),
+                }
             )
-            temp_folder = temp_folder.parent
-
-        breadcrumbs.extend(collected_folders)
-
-        # Add current folder
-        breadcrumbs.append(
-            {
-                "id": current_folder.id,
-                "name": current_folder.name,
-                "url": f"/sf/{token.uuid}/?subfolder={current_folder.id}",
-            }
-        )
 
     return render(
         request,
@@ -368,29 +488,100 @@ def serve_folder_share(request, uuid):
             "folders": subfolders,
             "files": files,
             "folder": current_folder,
-            "token": token,
+            "share_url": share_url,
+            "expiry": expiry,
             "is_shared": True,
             "breadcrumbs": breadcrumbs,
-            "root_folder": token.folder,
+            "root_folder": root_folder,
         },
     )
 
 
+def accepts_encoding(request, encoding):
+    """Return True if the request's Accept-Encoding allows ``encoding``."""
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        token, _, params = part.partition(";")
+        if token.strip().lower() not in (encoding, "*"):
+            continue
+        quality = params.strip().lower().removeprefix("q=") or "1"
+        try:
+            return float(quality) > 0
+        except ValueError:
+            return False
+    return False
+
+
+# Bytes read per worker-thread hop when streaming a file under ASGI
+ASYNC_CHUNK_SIZE = 64 * 1024
+
+
+async def read_chunks(filelike, chunk_size=ASYNC_CHUNK_SIZE):
+    """Read ``filelike`` in a worker thread, one chunk at a time."""
+    read = sync_to_async(filelike.read, thread_sensitive=False)
+    while chunk := await read(chunk_size):
+        yield chunk
+
+
+def stored_file_response(request, file_obj, as_attachment=False):
+    """
+    Stream a stored file.
+
+    Files compressed at rest are sent as-is with Content-Encoding when the
+    client accepts it, and decompressed on the fly otherwise.
+    """
+    if not file_obj.encoding:
+        return FileResponse(
+            file_obj.file, as_attachment=as_attachment, filename=file_obj.name
+        )
+
+    if accepts_encoding(request, file_obj.encoding):
+        response = FileResponse(
+            file_obj.file.storage.open(file_obj.file.name, "rb"),
+            as_attachment=as_attachment,
+            filename=file_obj.name,
+        )
+        response["Content-Encoding"] = file_obj.encoding
+    else:
+        response = FileResponse(
+            file_obj.open_content(), as_attachment=as_attachment, filename=file_obj.name
+        )
+        response["Content-Length"] = file_obj.size
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def file_response(request, file_obj, as_attachment=False):
+    """
+    Stream a stored file, without blocking the event loop under ASGI.
+
+    Django reads a file-backed response into memory in one go before sending
+    it over ASGI, so there the file is read through an async iterator
+    instead. It stays open until the response is closed.
+    """
+    response = stored_file_response(request, file_obj, as_attachment)
+    if isinstance(request, ASGIRequest):
+        response.streaming_content = read_chunks(response.file_to_stream)
+    return response
+
+
 @login_required
-def download_file(request, file_id):
+async def download_file(request, file_id):
     """Download a file owned by the user."""
-    file_obj = get_object_or_404(File, id=file_id)
+    file_obj = await aget_object_or_404(File, id=file_id)
+    user = await request.auser()
 
     # Check permissions
-    if file_obj.owner != request.user:
+    if file_obj.owner_id != user.id:
         raise PermissionDenied("You don't have permission to access this file.")
 
-    return FileResponse(file_obj.file, as_attachment=True, filename=file_obj.name)
+    return file_response(request, file_obj, as_attachment=True)
 
 
 @login_required
-def search_files(request):
+async def search_files(request):
     """Search files by content using embeddings."""
+    # Share the user login_required loaded with request.user in the template
+    user = request.user = await request.auser()
     search_results = []
     form = SearchForm(request.GET)
 
@@ -398,36 +589,20 @@ def search_files(request):
         query = form.cleaned_data["query"]
 
         try:
-            # Generate embedding for search query
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.embeddings.create(input=query, model=settings.EMBED_MODEL)
-            query_vector = response.data[0].embedding
-
-            # Get all user's file embeddings
-            user_files = File.objects.filter(owner=request.user)
-            file_embeddings = Embedding.objects.filter(file__in=user_files)
-
-            # Calculate similarity scores
-            results = []
-            for embedding in file_embeddings:
-                file_vector = np.array(embedding.vector)
-                query_vector_np = np.array(query_vector)
-
-                # Calculate cosine similarity
-                similarity = np.dot(file_vector, query_vector_np) / (
-                    np.linalg.norm(file_vector) * np.linalg.norm(query_vector_np)
-                )
-
-                results.append({"file": embedding.file, "similarity": similarity})
-
-            # Sort by similarity (descending)
-            results.sort(key=lambda x: x["similarity"], reverse=True)
-            search_results = [r["file"] for r in results[:20]]
+            ranked = await rank_user_files(user.id, query, related=("file__folder",))
+            search_results = [embedding.file for embedding, similarity in ranked]
+            await sync_to_async(prefetch_related_objects)(
+                search_results,
+                Prefetch(
+                    "sharetoken_set",
+                    queryset=ShareToken.objects.filter(expiry__gt=timezone.now()),
+                ),
+            )
 
         except Exception as e:
             messages.error(request, f"Search error: {str(e)}")
 
-    return render(
+    return await sync_to_async(render)(
         request,
         "search.html",
         {
@@ -459,51 +634,100 @@ def create_share(request, file_id):
     return redirect("dashboard")
 
 
-def serve_share(request, uuid):
-    """Serve a file through a share link."""
-    token = get_object_or_404(ShareToken, uuid=uuid)
+def load_share_token(model, uuid):
+    """Resolve an unexpired share token from the cache, or raise Http404."""
+    share = resolve_share_token(model, uuid)
+    if share is None:
+        raise Http404("This share link is invalid or has expired.")
+    return share
 
-    # Check if token is expired
-    if timezone.now() > token.expiry:
-        raise Http404("This share link has expired.")
+
+async def serve_share(request, uuid):
+    """Serve a file through a share link."""
+    share = await sync_to_async(load_share_token)(ShareToken, uuid)
+    file_obj = await aget_object_or_404(File, id=share["target_id"])
 
     # Stream the file
-    return FileResponse(token.file.file, filename=token.file.name)
+    return file_response(request, file_obj)
 
 
-def serve_shared_file(request, uuid, file_id):
+async def serve_shared_file(request, uuid, file_id):
     """Serve a file inside a shared folder."""
-    token = get_object_or_404(FolderShareToken, uuid=uuid)
+    share = await sync_to_async(load_share_token)(FolderShareToken, uuid)
+    return await serve_file_in_folder(request, share["target_id"], file_id)
 
-    # Check if token is expired
-    if timezone.now() > token.expiry:
-        raise Http404("This share link has expired.")
 
-    # Get the file
-    file = get_object_or_404(File, id=file_id)
+async def serve_file_in_folder(request, root_folder_id, file_id):
+    """Stream a file if it sits in the shared folder or one of its subfolders."""
+    file = await aget_object_or_404(File.objects.select_related("folder"), id=file_id)
 
     # Security check: make sure this file belongs to the shared folder or a subfolder
-    folder = file.folder
-    can_access = False
-
-    if folder:
-        # Check if it's in the shared folder directly
-        if folder.id == token.folder.id:
-            can_access = True
-        else:
-            # Check if it's in a subfolder
-            parent = folder
-            while parent:
-                if parent.id == token.folder.id:
-                    can_access = True
-                    break
-                parent = parent.parent
-
-    if not can_access:
+    if not (file.folder and file.folder.is_within(root_folder_id)):
         raise Http404("Access denied to this file.")
 
     # Stream the file
-    return FileResponse(file.file, filename=file.name)
+    return file_response(request, file)
+
+
+def load_signed_share(token, scope):
+    """Verify a signed share token without touching the database."""
+    try:
+        return load_share(token, scope)
+    except signing.BadSignature:
+        raise Http404("This share link is invalid or has expired.")
+
+
+async def serve_signed_share(request, token):
+    """Serve a file through a signed share link."""
+    payload = await sync_to_async(load_signed_share)(token, "file")
+    file_obj = await aget_object_or_404(File, id=payload["id"])
+    return file_response(request, file_obj)
+
+
+async def serve_signed_folder_share(request, token):
+    """Serve a folder through a signed share link."""
+    payload = await sync_to_async(load_signed_share)(token, "folder")
+    root_folder = await aget_object_or_404(
+        Folder.objects.select_related("owner"), id=payload["id"]
+    )
+    return await sync_to_async(render_shared_folder)(
+        request,
+        root_folder,
+        reverse("serve_signed_folder_share", args=[token]),
+        share_expiry(payload),
+    )
+
+
+async def serve_signed_shared_file(request, token, file_id):
+    """Serve a file inside a folder shared through a signed link."""
+    payload = await sync_to_async(load_signed_share)(token, "folder")
+    return await serve_file_in_folder(request, payload["id"], file_id)
+
+
+@login_required
+@require_GET
+def related_files(request, file_id):
+    """A file's most similar files, read from the precomputed RelatedFile rows."""
+    file_obj = get_object_or_404(File, id=file_id)
+
+    # Check permissions
+    if file_obj.owner_id != request.user.id:
+        raise PermissionDenied("You don't have permission to access this file.")
+
+    related = (
+        RelatedFile.objects.filter(file=file_obj)
+        .select_related("related")
+        .order_by("-similarity")
+    )
+    return render(
+        request,
+        "partials/related_files.html",
+        {
+            "file": file_obj,
+            "related": related,
+            "near_duplicate": settings.NEAR_DUPLICATE_SIMILARITY,
+        },
+    )
 
 
 @login_required
@@ -538,13 +762,21 @@ class FileListAPI(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """List all files for the authenticated user."""
-        files = File.objects.filter(owner=request.user).order_by("-uploaded")
-        serializer = FileSerializer(files, many=True, context={"request": request})
-        return Response(serializer.data)
+        """List the authenticated user's files, newest first, a page at a time."""
+        fields = parse_fields(request.query_params, FileSerializer.Meta.fields)
+        files = filter_files(
+            File.objects.filter(owner=request.user), request.query_params
+        )
 
+        serializer = FileListSerializer(request, fields=fields)
+        paginator = FileCursorPagination()
+        page = paginator.paginate_queryset(
+            serializer.rows(files), request, view=self
+        )
+        return paginator.get_paginated_response(serializer.to_representation(page))
 
-class FileUploadAPI(APIView):
+
+class FileUploadAPI(UploadQuotaMixin, APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser]
 
@@ -569,63 +801,138 @@ class FileUploadAPI(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(["GET"])
+class BulkFileUploadAPI(UploadQuotaMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """Upload many files at once, optionally with relative folder paths."""
+        serializer = BulkFileUploadSerializer(
+            data=request.data, context={"request": request}
+        )
+
+        if serializer.is_valid():
+            result = serializer.save()
+
+            # Process the whole batch as a single background task
+            postprocess_files.delay([f.id for f in result["files"]])
+
+            return Response(
+                {
+                    "files": FileSerializer(
+                        result["files"], many=True, context={"request": request}
+                    ).data,
+                    "skipped": result["skipped"],
+                },
+                status=status.HTTP_201_CREATED,
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def signed_share_api(request, scope, object_id):
+    """Issue a stateless signed share link for a file or folder."""
+    model = File if scope == "file" else Folder
+    obj = get_object_or_404(model, id=object_id, owner=request.user)
+
+    token, expiry = sign_share(scope, obj.id)
+    url_name = "serve_signed_share" if scope == "file" else "serve_signed_folder_share"
+
+    return Response(
+        {
+            "token": token,
+            "url": request.build_absolute_uri(reverse(url_name, args=[token])),
+            "expiry": expiry,
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def search_api(request):
+def revoke_signed_share_api(request):
+    """Revoke a signed share link before it expires."""
+    try:
+        payload = load_share(request.data.get("token", ""), check_revoked=False)
+    except signing.BadSignature as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    model = File if payload["s"] == "file" else Folder
+    get_object_or_404(model, id=payload["id"], owner=request.user)
+
+    revoke_share(payload)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+async def api_user(request):
+    """
+    Authenticate an async API request like DRF's default authentication.
+
+    DRF views are synchronous, so async API views check the session and HTTP
+    Basic credentials themselves. Returns None when neither is valid.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    try:
+        credentials = await sync_to_async(BasicAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return credentials[0] if credentials else None
+
+
+@require_GET
+async def search_api(request):
     """Search files by content using embeddings via API."""
+    user = await api_user(request)
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
     query = request.GET.get("q", "")
 
     if not query:
-        return Response(
+        return JsonResponse(
             {"error": "Query parameter 'q' is required"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
     try:
-        # Generate embedding for search query
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        response = client.embeddings.create(input=query, model=settings.EMBED_MODEL)
-        query_vector = response.data[0].embedding
-
-        # Get all user's file embeddings
-        user_files = File.objects.filter(owner=request.user)
-        file_embeddings = Embedding.objects.filter(file__in=user_files)
-
-        # Calculate similarity scores
-        results = []
-        for embedding in file_embeddings:
-            file_vector = np.array(embedding.vector)
-            query_vector_np = np.array(query_vector)
-
-            # Calculate cosine similarity
-            similarity = np.dot(file_vector, query_vector_np) / (
-                np.linalg.norm(file_vector) * np.linalg.norm(query_vector_np)
-            )
-
-            results.append(
-                {
-                    "file": embedding.file,
-                    "similarity": float(similarity),  # Convert to float for JSON
-                }
-            )
-
-        # Sort by similarity (descending) and take top 20
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        top_results = results[:20]
+        ranked = await rank_user_files(user.id, query, related=("file__owner",))
 
         # Serialize and return
         serialized_files = FileSerializer(
-            [r["file"] for r in top_results], many=True, context={"request": request}
+            [embedding.file for embedding, similarity in ranked],
+            many=True,
+            context={"request": request},
         ).data
 
         # Add similarity scores to serialized data
-        for i, file_data in enumerate(serialized_files):
-            file_data["similarity"] = top_results[i]["similarity"]
+        for file_data, (embedding, similarity) in zip(serialized_files, ranked):
+            file_data["similarity"] = similarity
 
-        return Response(serialized_files)
+        return JsonResponse(serialized_files, safe=False)
 
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse(
+            {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def metrics(request):
+    """Prometheus metrics, for staff or a scraper sending METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    # Checked first so scrapes don't load a session
+    scraper = bool(token) and constant_time_compare(authorization, f"Bearer {token}")
+    if not scraper and not request.user.is_staff:
+        raise PermissionDenied("Metrics are only available to staff.")
+    body, content_type = export_metrics()
+    return HttpResponse(body, content_type=content_type)
 
 
 def register(request):
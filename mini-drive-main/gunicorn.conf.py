@@ -0,0 +1,25 @@
+"""
+Gunicorn settings, picked up automatically from the project directory.
+
+When PROMETHEUS_MULTIPROC_DIR is set, each worker writes its metrics to files
+there (see core/metrics.py). Stale files from a previous run are cleared on
+start-up, and a worker's live gauges are dropped when it exits.
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+
+def on_starting(server):
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        Path(multiproc_dir).mkdir(parents=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
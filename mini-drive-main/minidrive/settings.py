@@ -30,12 +30,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -59,14 +61,33 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "minidrive.wsgi.application"
+ASGI_APPLICATION = "minidrive.asgi.application"
 
 # Database
+# Production SQLite mode for several web/worker processes writing at once:
+# WAL journal, synchronous=NORMAL, mmap and persistent connections (the
+# PRAGMAs are applied per connection by core.signals.configure_sqlite)
+SQLITE_CONCURRENCY = os.getenv("SQLITE_CONCURRENCY", "0") == "1"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Seconds a writer waits for the lock before "database is locked"
+            "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),
+        },
+        "CONN_MAX_AGE": int(
+            os.getenv("CONN_MAX_AGE", 600 if SQLITE_CONCURRENCY else 0)
+        ),
+        "CONN_HEALTH_CHECKS": SQLITE_CONCURRENCY,
     }
 }
+if SQLITE_CONCURRENCY:
+    # Take the write lock at BEGIN so waiting writers honour the timeout
+    # instead of failing on a lock upgrade
+    DATABASES["default"]["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,26 +114,87 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 # Media files
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", BASE_DIR / "media")
 
+# Fan media out into hash-prefixed subdirectories (files/ab/cd/name)
+MEDIA_SHARDING = os.getenv("MEDIA_SHARDING", "1") == "1"
+
+# Gzip text-like uploads at rest (File.size stays the logical size)
+COMPRESS_AT_REST = os.getenv("COMPRESS_AT_REST", "0") == "1"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "core.storage.MediaStorage",
+        "OPTIONS": {
+            "shard": MEDIA_SHARDING,
+            "compress": COMPRESS_AT_REST,
+            "compress_level": int(os.getenv("COMPRESS_LEVEL", 6)),
+        },
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # OpenAI config
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional, e.g. a local stand-in such as fake_openai_server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 
+# Gemini chat config; GEMINI_API_BASE can point at a local stand-in
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+GEMINI_API_BASE = os.getenv(
+    "GEMINI_API_BASE", "https://generativelanguage.googleapis.com"
+)
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 60))
+
+# Related files kept per file, and the embedding similarity from which two
+# files are reported as near-duplicates
+RELATED_FILES = int(os.getenv("RELATED_FILES", 10))
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", 0.97))
+
+# Bearer token a Prometheus scraper sends to /metrics (staff users need none)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Staff can profile a request with ?_profile=1 or an "X-Profile: 1" header
+# (0 disables it); stacks are sampled every PROFILING_INTERVAL seconds
+PROFILING = os.getenv("PROFILING", "1") == "1"
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", 0.005))
+
 # Storage limits
 MAX_STORAGE_MB = int(os.getenv("MAX_STORAGE_MB", 5000))
 
+# Maximum number of files accepted in a single (bulk) upload request
+DATA_UPLOAD_MAX_NUMBER_FILES = int(os.getenv("MAX_UPLOAD_FILES", 1000))
+
 # Celery settings - eager mode (no separate worker needed)
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_BROKER_URL = "memory://"
 
+# Periodic jobs when running celery beat (otherwise run the management
+# commands of the same name from cron)
+CELERY_BEAT_SCHEDULE = {
+    "purge-storage": {"task": "core.tasks.purge_storage", "schedule": 60.0},
+    "sweep-share-tokens": {
+        "task": "core.tasks.sweep_share_tokens",
+        "schedule": 3600.0,
+    },
+    # Processed files are added as they come; the rebuild refills the lists
+    # of files whose related files were deleted since
+    "compute-related-files": {
+        "task": "core.tasks.compute_related_files",
+        "schedule": 86400.0,
+    },
+}
+
 # Authentication settings
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"